@@ -0,0 +1,86 @@
+"""对比顺序抓取、并发抓取与增量重抓的吞吐量（pages/s），使用本地合成网站，不访问外网
+
+最后从抓取时保存的原始网页存档重新解析记录，检查与抓取输出一致。
+
+用法（在 IR_hw4 目录下）：python -m benchmarks.bench_crawl --pages 300 --latency 0.02 --concurrency 16
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import catch_url
+from benchmarks.fixtures import start_site_server
+from page_store import PageStore
+from records import iter_records
+
+
+def run_crawl(start_url, workers, incremental=False):
+    """在干净的全局状态下爬取一次，返回 (耗时, 页面数, URL 集合, 邻接表)
+
+    incremental 为 True 时使用上一次抓取写入的 catch_url.meta_file 进行增量抓取。
+    """
+    catch_url.reset_state()
+    catch_url.incremental = incremental
+    catch_url.crawl_meta = catch_url.load_crawl_meta(catch_url.meta_file) if incremental else {}
+    catch_url.output_file = os.path.join(tempfile.mkdtemp(), "urls_with_data.jsonl")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        catch_url.crawl_urls(start_url, workers)
+    elapsed = time.perf_counter() - start
+    urls = {entry["url"] for entry in iter_records(catch_url.output_file)}
+    return elapsed, len(catch_url.visited), urls, catch_url.link_graph.to_adj_list()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--links", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟的单次请求延迟（秒）")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server, start_url = start_site_server(args.pages, args.links, args.latency)
+    catch_url.domain_keyword = "127.0.0.1"
+    catch_url.checkpoint_dir = None
+    catch_url.page_store_dir = os.path.join(tempfile.mkdtemp(), "page_store")
+    catch_url.meta_file = os.path.join(tempfile.mkdtemp(), "crawl_meta.jsonl")
+    try:
+        seq_time, seq_pages, seq_urls, seq_adj = run_crawl(start_url, 1)
+        con_time, con_pages, con_urls, con_adj = run_crawl(start_url, args.concurrency)
+
+        # 修改约 5% 的页面后进行增量重抓
+        modified = sorted(server.pages)[::20]
+        for path in modified:
+            server.pages[path] = server.pages[path].replace(b"</body>", b"<p>updated</p></body>")
+        inc_time, inc_pages, inc_urls, _ = run_crawl(start_url, args.concurrency, incremental=True)
+        changed = len(catch_url.changed_urls)
+    finally:
+        server.shutdown()
+
+    # 不访问网站，从存档重新解析
+    reextract_file = os.path.join(tempfile.mkdtemp(), "urls_reextracted.jsonl")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        catch_url.reextract(reextract_file)
+    reextract_time = time.perf_counter() - start
+    reextract_urls = {entry["url"] for entry in iter_records(reextract_file)}
+    store_stats = PageStore(catch_url.page_store_dir).stats()
+
+    print(f"sequential : {seq_pages} pages in {seq_time:.2f}s ({seq_pages / seq_time:.1f} pages/s)")
+    print(f"concurrent : {con_pages} pages in {con_time:.2f}s ({con_pages / con_time:.1f} pages/s, "
+          f"workers={args.concurrency})")
+    print(f"speedup    : {seq_time / con_time:.1f}x")
+    print(f"incremental: {inc_pages} pages in {inc_time:.2f}s ({inc_pages / inc_time:.1f} pages/s), "
+          f"{changed} changed records after modifying {len(modified)} pages")
+    print(f"same output: {seq_urls == con_urls and seq_adj == con_adj}")
+    print(f"page store : {store_stats['urls']} URLs, {store_stats['objects']} distinct pages, "
+          f"{store_stats['compressed_bytes'] / 1024:.0f} KiB compressed")
+    print(f"re-extract : {len(reextract_urls)} records in {reextract_time:.2f}s, "
+          f"same URLs as incremental crawl: {reextract_urls == inc_urls}")
+
+
+if __name__ == '__main__':
+    main()
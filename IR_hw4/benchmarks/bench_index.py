@@ -0,0 +1,85 @@
+"""对比逐条索引与 _bulk 批量并行索引的吞吐量（docs/s），使用本地 Elasticsearch 替身，不需要真实的 ES
+
+用法（在 IR_hw4 目录下）：python -m benchmarks.bench_index --docs 5000 --latency 0.002 --reject-rate 0.01
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+from elasticsearch import Elasticsearch
+
+import es_createInex
+from benchmarks.es_standin import start_es_standin
+from dedup import load_and_deduplicate
+from records import doc_id, dumps_record, make_doc
+
+
+def write_records(file_path, num_docs, seed=0):
+    """生成合成的爬取结果文件"""
+    rng = random.Random(seed)
+    words = ["南开", "大学", "学院", "通知", "公告", "招生", "研究", "新闻", "图书馆", "计算机"]
+    with open(file_path, "w", encoding="utf-8") as f:
+        for i in range(num_docs):
+            title = " ".join(rng.choices(words, k=4)) + f" {i}"
+            f.write(dumps_record({
+                "url": f"https://www.nankai.edu.cn/info/{i}.htm",
+                "title": title,
+                "description": " ".join(rng.choices(words, k=12)),
+                "anchor_text": rng.choices(words, k=5),
+                "content": " ".join(rng.choices(words, k=80)),
+                "page_rank": rng.random() / num_docs,
+            }))
+
+
+def index_one_by_one(file_path, index):
+    """旧的做法：每个文档一次 es.index 请求"""
+    for record in load_and_deduplicate(file_path):
+        doc = make_doc(record)
+        es_createInex.es.index(index=index, id=doc_id(doc["url"]), document=doc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.002, help="替身服务器的单次请求延迟（秒）")
+    parser.add_argument("--reject-rate", type=float, default=0.01, help="_bulk 中随机返回 429 的比例")
+    parser.add_argument("--chunk-size", type=int, default=es_createInex.bulk_chunk_size)
+    parser.add_argument("--workers", type=int, default=es_createInex.bulk_workers)
+    args = parser.parse_args()
+
+    file_path = os.path.join(tempfile.mkdtemp(), "urls_with_data.jsonl")
+    write_records(file_path, args.docs)
+    server, url = start_es_standin(args.latency, args.reject_rate)
+    es_createInex.es = Elasticsearch(url)
+    es_createInex.bulk_backoff = 0.01
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            index = es_createInex.create_index()
+            start = time.perf_counter()
+            index_one_by_one(file_path, index)
+            single_time = time.perf_counter() - start
+
+            index = es_createInex.create_index()
+            start = time.perf_counter()
+            indexed, failed = es_createInex.index_data_to_elasticsearch(file_path, args.chunk_size, args.workers,
+                                                                        index=index, tune_for_bulk=True)
+            bulk_time = time.perf_counter() - start
+        stored = len(server.state.indices[index]["docs"])
+        settings = {key: value for key, value in server.state.indices[index]["settings"].items()
+                    if key in ("refresh_interval", "number_of_replicas")}
+    finally:
+        server.shutdown()
+
+    print(f"one-by-one : {args.docs} docs in {single_time:.2f}s ({args.docs / single_time:.1f} docs/s)")
+    print(f"bulk       : {indexed} docs in {bulk_time:.2f}s ({indexed / bulk_time:.1f} docs/s, "
+          f"{failed} failed, chunk_size={args.chunk_size}, workers={args.workers})")
+    print(f"speedup    : {single_time / bulk_time:.1f}x")
+    print(f"stored     : {stored} docs, settings restored: {not settings}")
+
+
+if __name__ == '__main__':
+    main()
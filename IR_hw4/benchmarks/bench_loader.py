@@ -0,0 +1,72 @@
+"""对比旧版 load_and_deduplicate 的逐行解析（正则 + ast.literal_eval）与 JSONL 流式加载的速度（lines/s）
+
+用法（在 IR_hw4 目录下）：python -m benchmarks.bench_loader --docs 20000
+"""
+import argparse
+import ast
+import contextlib
+import io
+import os
+import re
+import tempfile
+import time
+
+from benchmarks.bench_index import write_records
+from dedup import iter_deduplicated
+from records import iter_records
+
+
+def legacy_parse_line(line):
+    """旧版 load_and_deduplicate 中对每一行的处理"""
+    line = line.strip()
+    line = re.sub(r'\\+', '', line)
+    line = re.sub(r'np\.float64\((.*?)\)', r'\1', line)
+    line = re.sub(r'"title":\s*"([^"]*)"', lambda m: '"title": "' + m.group(1).replace('"', '\\"') + '"', line)
+    line = line.replace('"It\'s', r'\"It\'s').replace('world."', 'world.\"')
+    return ast.literal_eval(line)
+
+
+def write_legacy(jsonl_path, legacy_path):
+    """把 JSONL 记录转换为旧版的 dict repr 格式（PageRank 为 np.float64(...)）"""
+    with open(legacy_path, "w", encoding="utf-8") as f:
+        for record in iter_records(jsonl_path):
+            record.pop("schema", None)
+            page_rank = record.pop("page_rank")
+            f.write(repr(record)[:-1] + f", 'page_rank': np.float64({page_rank!r})}}\n")
+
+
+def timed(func):
+    start = time.perf_counter()
+    count = func()
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=20000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    jsonl_path = os.path.join(tmp, "urls_with_data.jsonl")
+    legacy_path = os.path.join(tmp, "urls_with_data.txt")
+    write_records(jsonl_path, args.docs)
+    write_legacy(jsonl_path, legacy_path)
+
+    def legacy():
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if legacy_parse_line(line))
+
+    def streaming():
+        return sum(1 for _ in iter_records(jsonl_path))
+
+    def streaming_dedup():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return sum(1 for _ in iter_deduplicated(jsonl_path))
+
+    for name, func in [("legacy parser", legacy), ("jsonl stream", streaming), ("jsonl + dedup", streaming_dedup)]:
+        count, elapsed = timed(func)
+        print(f"{name:14}: {count} records in {elapsed:.2f}s ({args.docs / elapsed:.0f} lines/s)")
+
+
+if __name__ == '__main__':
+    main()
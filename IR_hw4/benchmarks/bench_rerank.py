@@ -0,0 +1,96 @@
+"""个性化重排序的单次查询延迟：旧版逐对拟合 TfidfVectorizer、rerank.rerank 的批量实现，
+以及使用索引时预先计算的文档向量（doc_vectors.py）三者对比
+
+用法（在 IR_hw4 目录下）：python -m benchmarks.bench_rerank --hits 10 --history 5
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+import doc_vectors
+import rerank
+
+WORDS = ["nankai", "university", "library", "computer", "college", "news", "notice", "admission",
+         "research", "student", "teacher", "summer", "lecture", "science", "history", "center"]
+
+
+def compute_cosine_similarity(query, document):
+    """旧版 web.py 中的实现：每对文本拟合一次 TfidfVectorizer"""
+    vectorizer = TfidfVectorizer()
+    tfidf_matrix = vectorizer.fit_transform([query, document])
+    return cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+
+
+def legacy_rerank(query, hits, history):
+    """旧版 web.search 中的重排序逻辑"""
+    titles = [hit['_source'].get('title', '').strip() for hit in hits]
+    historical = [sum(compute_cosine_similarity(item.strip(), title) for item in history) for title in titles]
+    query_sims = [compute_cosine_similarity(query, title) for title in titles]
+    pageranks = [rerank.get_pagerank(hit['_source']) for hit in hits]
+    scores = (rerank.weight_history * rerank.normalize(historical) +
+              rerank.weight_query * rerank.normalize(query_sims) +
+              rerank.weight_pagerank * rerank.normalize(pageranks))
+    return [hit for _, hit in sorted(zip(scores, hits), key=lambda x: x[0], reverse=True)]
+
+
+def make_case(rng, num_hits, num_history):
+    hits = [{"_source": {"title": " ".join(rng.choices(WORDS, k=5)), "pagerank": rng.random()}}
+            for _ in range(num_hits)]
+    history = [" ".join(rng.choices(WORDS, k=2)) for _ in range(num_history)]
+    return " ".join(rng.choices(WORDS, k=2)), hits, history
+
+
+def with_vectors(cases, index="bench_v1"):
+    """为所有合成结果保存文档向量，返回带 _index / _id 的用例副本"""
+    writer = doc_vectors.DocVectorWriter()
+    vector_cases = []
+    for n, (query, hits, history) in enumerate(cases):
+        vector_hits = []
+        for i, hit in enumerate(hits):
+            hit_id = f"{n:020d}{i:020d}"
+            writer.add(hit_id, hit["_source"])
+            vector_hits.append({"_index": index, "_id": hit_id, "_source": hit["_source"]})
+        vector_cases.append((query, vector_hits, history))
+    doc_vectors.save_vectors(writer, index)
+    return vector_cases
+
+
+def measure(func, cases):
+    latencies = []
+    for query, hits, history in cases:
+        start = time.perf_counter()
+        func(query, hits, history)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hits", type=int, default=10)
+    parser.add_argument("--history", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    cases = [make_case(rng, args.hits, args.history) for _ in range(args.queries)]
+    agree = sum(legacy_rerank(*case)[0] is rerank.rerank(*case)[0] for case in cases)
+    with tempfile.TemporaryDirectory() as tmp:
+        doc_vectors.vectors_dir = os.path.join(tmp, "doc_vectors")
+        vector_cases = with_vectors(cases)
+        for name, func, func_cases in [("per-pair fits", legacy_rerank, cases), ("batched", rerank.rerank, cases),
+                                       ("precomputed", rerank.rerank, vector_cases)]:
+            p50, p99 = measure(func, func_cases)
+            print(f"{name:13}: p50 {p50:.2f} ms, p99 {p99:.2f} ms per query "
+                  f"({args.hits} hits, {args.history} history items)")
+    print(f"same top result in {agree}/{len(cases)} queries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""检索延迟：进程内的 BM25 索引（local_search.py）与 Elasticsearch 对比
+
+使用 web.build_search_body 生成与网站相同的查询（function_score + multi_match + search_after 排序），
+另外测量标题通配符查询（前缀 / 包含 / 中间的 * 和 ?）的延迟。
+默认与本地的 Elasticsearch 替身对比，替身不计算相关度，只反映一次 HTTP 往返和客户端的开销；
+指定 --es-url 时对比真实的 Elasticsearch（先把同一份合成数据写入一个临时索引）。
+
+用法（在 IR_hw4 目录下）：python -m benchmarks.bench_search --docs 20000 --queries 200
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from elasticsearch import Elasticsearch
+
+import doc_vectors
+import es_createInex
+import local_search
+import query_cache
+import suggest
+import web
+from benchmarks.bench_index import write_records
+from benchmarks.es_standin import start_es_standin
+
+WORDS = ["南开", "大学", "学院", "通知", "公告", "招生", "研究", "新闻", "图书馆", "计算机"]
+
+
+def make_patterns(rng, count):
+    """通配符查询：前缀、包含、中间的 * 和 ?"""
+    patterns = []
+    for _ in range(count):
+        first, second = rng.sample(WORDS, 2)
+        patterns.append(rng.choice([f"{first}*", f"*{first}*", f"{first}*{second}*", f"*{first} ?{second[1:]}*"]))
+    return patterns
+
+
+def measure(client, index, queries, use_wildcard=False):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        client.search(index=index, body=web.build_search_body(query, use_wildcard))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--es-url", help="真实 Elasticsearch 的地址，不指定时使用替身")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    queries = [" ".join(rng.sample(WORDS, rng.randint(1, 3))) for _ in range(args.queries)]
+    patterns = make_patterns(rng, args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        doc_vectors.vectors_dir = os.path.join(tmp, "doc_vectors")
+        suggest.suggest_dir = os.path.join(tmp, "suggestions")
+        query_cache.version_file = os.path.join(tmp, "index_version.txt")
+        file_path = os.path.join(tmp, "urls_with_data.jsonl")
+        write_records(file_path, args.docs)
+
+        root = os.path.join(tmp, "local_index")
+        os.makedirs(root)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            version = local_search.build_local_index(file_path, root)
+        build_time = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, version, name)) for name in os.listdir(os.path.join(root, version)))
+        local = local_search.LocalSearch(root)
+        measure(local, None, queries[:5])  # 第一次查询时加载词典
+        measure(local, None, patterns[:5], use_wildcard=True)
+        local_p50, local_p99 = measure(local, None, queries)
+        local_wild_p50, local_wild_p99 = measure(local, None, patterns, use_wildcard=True)
+
+        server = None
+        if args.es_url:
+            es_createInex.es = Elasticsearch(args.es_url)
+        else:
+            server, url = start_es_standin()
+            es_createInex.es = Elasticsearch(url)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                index = es_createInex.create_index()
+                es_createInex.index_data_to_elasticsearch(file_path, index=index, tune_for_bulk=True)
+                es_createInex.es.indices.refresh(index=index)
+            es_p50, es_p99 = measure(es_createInex.es, index, queries)
+            es_wild_p50, es_wild_p99 = measure(es_createInex.es, index, patterns, use_wildcard=True)
+            if args.es_url:
+                es_createInex.es.indices.delete(index=index)
+        finally:
+            if server is not None:
+                server.shutdown()
+
+    print(f"local index : {args.docs} docs built in {build_time:.2f}s, {size / 1024 / 1024:.1f} MiB on disk")
+    es_name = "elasticsearch" if args.es_url else "es stand-in"
+    note = "" if args.es_url else " (HTTP round trip only, no scoring)"
+    print(f"local BM25  : p50 {local_p50:.2f} ms, p99 {local_p99:.2f} ms per query")
+    print(f"local wild  : p50 {local_wild_p50:.2f} ms, p99 {local_wild_p99:.2f} ms per wildcard pattern")
+    print(f"{es_name:12}: p50 {es_p50:.2f} ms, p99 {es_p99:.2f} ms per query{note}")
+    print(f"{es_name:12}: p50 {es_wild_p50:.2f} ms, p99 {es_wild_p99:.2f} ms per wildcard pattern{note}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""截图快照服务的吞吐量：用假浏览器驱动测试会话池、任务队列、合并和缓存
+
+假驱动启动需要 startup 秒，每次截图需要 render 秒，不启动真正的浏览器。
+旧版每个请求都新建并关闭一个浏览器，耗时约为 startup + render。
+
+用法（在 IR_hw4 目录下）：python -m benchmarks.bench_snapshot --jobs 40 --pool 4
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+from snapshot_service import SnapshotService, DONE
+
+PNG_BYTES = (b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15"
+             b"\xc4\x89\x00\x00\x00\rIDATx\x9cc\xf8\x0f\x00\x00\x01\x01\x00\x05\x18\xd8N\x00\x00\x00\x00IEND\xaeB`\x82")
+
+
+class FakeDriver:
+    """模拟 WebDriver 的接口，记录启动次数"""
+    started = 0
+    lock = threading.Lock()
+
+    def __init__(self, startup, render):
+        time.sleep(startup)
+        with FakeDriver.lock:
+            FakeDriver.started += 1
+        self.render = render
+        self.url = None
+
+    def get(self, url):
+        if "fail" in url:
+            raise RuntimeError(f"cannot load {url}")
+        self.url = url
+
+    def save_screenshot(self, path):
+        time.sleep(self.render)
+        with open(path, "wb") as f:
+            f.write(PNG_BYTES)
+
+    def quit(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=40, help="不同 URL 的数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每个 URL 并发提交的次数")
+    parser.add_argument("--pool", type=int, default=4)
+    parser.add_argument("--startup", type=float, default=0.5)
+    parser.add_argument("--render", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = SnapshotService(lambda: FakeDriver(args.startup, args.render), pool_size=args.pool,
+                                  cache_dir=tmp)
+        urls = [f"https://www.nankai.edu.cn/page/{i}" for i in range(args.jobs)] + ["https://fail.nankai.edu.cn/"]
+
+        start = time.perf_counter()
+        submit_start = time.perf_counter()
+        jobs = [service.submit(url) for url in urls for _ in range(args.repeat)]
+        submit_ms = (time.perf_counter() - submit_start) * 1000 / len(jobs)
+        for job in jobs:
+            job.done.wait()
+        elapsed = time.perf_counter() - start
+
+        done = sum(job.status == DONE for job in jobs)
+        print(f"{len(jobs)} requests for {len(urls)} URLs: {done} done, {len(jobs) - done} failed "
+              f"in {elapsed:.2f}s (submit {submit_ms:.3f} ms/request, {FakeDriver.started} browser sessions)")
+        legacy = len(urls) * args.repeat * (args.startup + args.render)
+        print(f"one browser per request, sequential: ~{legacy:.1f}s")
+
+        start = time.perf_counter()
+        cached = [service.submit(url) for url in urls[:-1]]
+        print(f"resubmitting {len(cached)} cached URLs: {(time.perf_counter() - start) * 1000:.2f} ms, "
+              f"all done: {all(job.status == DONE for job in cached)}")
+        print(service.stats())
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()
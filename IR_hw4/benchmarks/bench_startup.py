@@ -0,0 +1,68 @@
+"""Web 进程的冷启动耗时：import wsgi（create_app）所需时间和各依赖的导入开销
+
+在子进程中用 python -X importtime 导入 wsgi，按顶层包统计导入耗时；
+再单独测量延迟导入的 sklearn / selenium 在第一次使用时的开销。
+
+用法（在 IR_hw4 目录下）：python -m benchmarks.bench_startup --runs 3
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, cwd):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.setdefault("SECRET_KEY", "bench-startup")  # wsgi 没有密钥时拒绝启动
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def package_costs(stderr):
+    """解析 -X importtime 的输出，按顶层包汇总各模块自身的导入耗时，返回 {包名: 微秒}"""
+    costs = {}
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+\d+ \| *(\S+)", line)
+        if match:
+            package = match.group(2).split(".")[0]
+            costs[package] = costs.get(package, 0) + int(match.group(1))
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    ready, imports = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.symlink(os.path.join(ROOT, "web"), os.path.join(tmp, "web"))
+        for _ in range(args.runs):
+            result = run_python("import wsgi", tmp)
+            ready.append(float(re.search(r"ready in (\d+) ms", result.stdout).group(1)))
+            for package, cost in package_costs(result.stderr).items():
+                imports.setdefault(package, []).append(cost)
+
+        print(f"worker ready: median {statistics.median(ready):.0f} ms over {args.runs} runs")
+        print("largest imports at startup:")
+        for package, costs in sorted(imports.items(), key=lambda item: -statistics.median(item[1]))[:8]:
+            print(f"  {package:20} {statistics.median(costs) / 1000:7.1f} ms")
+
+        print("deferred until first use:")
+        for package in ("sklearn.feature_extraction.text", "selenium.webdriver"):
+            try:
+                result = run_python(f"import {package}", tmp)
+            except subprocess.CalledProcessError:
+                print(f"  {package:20} not installed")
+                continue
+            total = sum(package_costs(result.stderr).values())
+            print(f"  {package:20} {total / 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""自动补全的延迟：用合成的标题 / 锚文本和查询历史建立 suggest.SuggestIndex，
+测量逐字输入时每次补全请求和记录一次查询的耗时
+
+用法（在 IR_hw4 目录下）：python -m benchmarks.bench_suggest --docs 100000 --queries 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import query_cache
+import suggest
+from benchmarks.bench_index import write_records
+from dedup import iter_deduplicated
+from records import make_doc
+
+
+def percentiles(latencies):
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000, help="输入的查询数，每个查询逐字请求补全")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        suggest.suggest_dir = os.path.join(tmp, "suggestions")
+        query_cache.version_file = os.path.join(tmp, "index_version.txt")
+        file_path = os.path.join(tmp, "urls_with_data.jsonl")
+        write_records(file_path, args.docs)
+        writer = suggest.PhraseWriter()
+        titles = []
+        for doc in (make_doc(record) for record in iter_deduplicated(file_path)):
+            writer.add(doc["doc_id"], doc)
+            titles.append(doc["title"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            suggest.save_phrases(writer, "bench_v1")
+        query_cache.mark_index_changed("bench_v1")
+
+        history = [(rng.choice(titles)[:rng.randint(2, 8)], f"user{rng.randrange(200)}") for _ in range(20000)]
+        index = suggest.SuggestIndex(history)
+        start = time.perf_counter()
+        index.suggest("南")
+        load_time = time.perf_counter() - start
+
+        typed = [rng.choice(titles)[:rng.randint(3, 12)] for _ in range(args.queries)]
+        suggest_latencies, add_latencies = [], []
+        for query in typed:
+            for length in range(1, len(query) + 1):
+                start = time.perf_counter()
+                index.suggest(query[:length])
+                suggest_latencies.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            index.add_query(query, f"user{rng.randrange(200)}")
+            add_latencies.append((time.perf_counter() - start) * 1000)
+        stats = index.stats()
+
+    suggest_p50, suggest_p99 = percentiles(suggest_latencies)
+    add_p50, add_p99 = percentiles(add_latencies)
+    print(f"load       : {stats['phrases']} phrases in {load_time * 1000:.0f} ms")
+    print(f"suggest    : p50 {suggest_p50:.3f} ms, p99 {suggest_p99:.3f} ms per keystroke "
+          f"({len(suggest_latencies)} requests, {stats['misses']} cache misses)")
+    print(f"add_query  : p50 {add_p50:.3f} ms, p99 {add_p99:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""本地 Elasticsearch 替身：实现本项目用到的少量 REST 接口，用于离线测试和基准测试
+
+只在内存中保存文档，不做真正的检索打分；可以通过 reject_rate 随机返回 429 来测试重试逻辑，
+通过 latency 模拟每个请求的网络往返时间。
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+import fnmatch
+import json
+import random
+import threading
+import time
+
+
+class StandinState:
+    """替身服务器的内存状态"""
+
+    def __init__(self, latency=0.0, reject_rate=0.0, seed=0):
+        self.latency = latency
+        self.reject_rate = reject_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.indices = {}  # 索引名 -> {"settings": {}, "mappings": {}, "docs": {id: doc}}
+        self.aliases = {}  # 别名 -> 索引名
+        self.requests = []  # (方法, 路径)，用于检查客户端发出的请求
+
+    def should_reject(self):
+        with self.lock:
+            return self.rng.random() < self.reject_rate
+
+    def resolve(self, name):
+        """把别名解析为实际的索引名"""
+        return self.aliases.get(name, name)
+
+    def search(self, name, body):
+        """极简的检索：所有文档得分都为 1.0，按插入顺序（或 sort 指定的字段）返回前 size 个，
+        支持 from 和 search_after，只用于测试请求流程"""
+        index = self.indices.get(self.resolve(name))
+        if index is None:
+            return 404, {"error": {"type": "index_not_found_exception", "index": name}, "status": 404}
+        size = body.get("size", 10)
+        start = body.get("from", 0)
+        hits = [{"_index": self.resolve(name), "_id": doc_id, "_score": 1.0, "_source": doc}
+                for doc_id, doc in index["docs"].items()]
+        total = len(hits)
+        if "sort" in body:
+            # 只支持升序的字段和固定为 1.0 的 _score
+            fields = [next(iter(spec)) if isinstance(spec, dict) else spec for spec in body["sort"]]
+            for hit in hits:
+                hit["sort"] = [1.0 if f == "_score" else hit["_source"].get(f, "") for f in fields]
+            hits.sort(key=lambda hit: hit["sort"])
+            if "search_after" in body:
+                hits = [hit for hit in hits if hit["sort"] > body["search_after"]]
+        hits = hits[start:start + size]
+        return 200, {"took": 1, "timed_out": False,
+                     "hits": {"total": {"value": total, "relation": "eq"}, "max_score": 1.0, "hits": hits}}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state = None  # 由 start_es_standin 设置
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/vnd.elasticsearch+json; compatible-with=8")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def handle_any(self):
+        state = self.state
+        if state.latency:
+            time.sleep(state.latency)
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        body = self.read_body()
+        with state.lock:
+            state.requests.append((self.command, parsed.path))
+        status, response = self.route(parts, query, body)
+        self.send_json(status, response)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_any
+
+    def route(self, parts, query, body):
+        state = self.state
+        if not parts:
+            return 200, {"version": {"number": "8.0.0"}, "tagline": "You Know, for Search"}
+        if parts[-1] == "_bulk":
+            return self.bulk(parts[0] if len(parts) > 1 else None, body)
+        if parts[-1] == "_msearch":
+            return self.msearch(unquote(parts[0]) if len(parts) > 1 else None, body)
+        if parts[0] == "_aliases":
+            return self.update_aliases(json.loads(body))
+        if parts[0] == "_alias":
+            return self.get_alias(unquote(parts[1]))
+
+        name = unquote(parts[0])
+        with state.lock:
+            if "*" in name or "," in name:
+                patterns = name.split(",")
+                matched = {n: {"aliases": {a: {} for a, t in state.aliases.items() if t == n},
+                               "settings": {"index": dict(i["settings"])}}
+                           for n, i in state.indices.items() if any(fnmatch.fnmatch(n, p) for p in patterns)}
+                return 200, matched
+            if len(parts) == 1 and self.command != "PUT" and name in state.aliases:
+                name = state.aliases[name]
+            if len(parts) > 1:
+                name = state.resolve(name)
+            index = state.indices.get(name)
+            if len(parts) == 1:
+                if self.command == "HEAD":
+                    return (200 if index is not None else 404), {}
+                if self.command == "PUT":
+                    if index is not None or name in state.aliases:
+                        return 400, {"error": {"type": "resource_already_exists_exception"}}
+                    spec = json.loads(body or b"{}")
+                    state.indices[name] = {"settings": spec.get("settings", {}),
+                                           "mappings": spec.get("mappings", {}), "docs": {}}
+                    return 200, {"acknowledged": True, "index": name}
+                if self.command == "DELETE":
+                    if index is None:
+                        return 404, {"error": {"type": "index_not_found_exception"}}
+                    del state.indices[name]
+                    for alias in [a for a, t in state.aliases.items() if t == name]:
+                        del state.aliases[alias]
+                    return 200, {"acknowledged": True}
+                if self.command == "GET":
+                    aliases = {a: {} for a, t in state.aliases.items() if t == name}
+                    return 200, {name: {"aliases": aliases, "mappings": index["mappings"],
+                                        "settings": {"index": dict(index["settings"])}}}
+            if index is None:
+                return 404, {"error": {"type": "index_not_found_exception", "index": name}, "status": 404}
+            action = parts[1]
+            if action == "_settings":
+                if self.command == "PUT":
+                    settings = json.loads(body or b"{}")
+                    flat = settings.get("index", settings)
+                    for key, value in flat.items():
+                        if value is None:
+                            index["settings"].pop(key, None)
+                        else:
+                            index["settings"][key] = value
+                    return 200, {"acknowledged": True}
+                return 200, {name: {"settings": {"index": dict(index["settings"])}}}
+            if action in ("_refresh", "_forcemerge"):
+                return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+            if action == "_search":
+                return state.search(name, json.loads(body or b"{}"))
+            if action == "_doc" and len(parts) == 3:
+                index["docs"][parts[2]] = json.loads(body)
+                return 200, {"_index": name, "_id": parts[2], "result": "created"}
+            if action == "_count":
+                return 200, {"count": len(index["docs"])}
+        return 400, {"error": {"type": "unsupported_operation", "path": "/".join(parts)}}
+
+    def msearch(self, default_index, body):
+        """处理 NDJSON 格式的 _msearch 请求，每个子查询单独返回结果或错误"""
+        lines = [line for line in body.split(b"\n") if line.strip()]
+        responses = []
+        for header_line, body_line in zip(lines[::2], lines[1::2]):
+            name = json.loads(header_line).get("index", default_index)
+            status, response = self.state.search(name, json.loads(body_line))
+            response["status"] = status
+            responses.append(response)
+        return 200, {"took": 1, "responses": responses}
+
+    def update_aliases(self, body):
+        """原子地执行一组别名操作（add / remove / remove_index）"""
+        state = self.state
+        with state.lock:
+            aliases = dict(state.aliases)
+            indices = dict(state.indices)
+            for action in body.get("actions", []):
+                (kind, spec), = action.items()
+                if kind == "add":
+                    if spec["alias"] in indices or spec["index"] not in indices:
+                        return 400, {"error": {"type": "invalid_alias_name_exception"}}
+                    aliases[spec["alias"]] = spec["index"]
+                elif kind == "remove":
+                    if aliases.get(spec["alias"]) != spec["index"]:
+                        return 404, {"error": {"type": "aliases_not_found_exception"}}
+                    del aliases[spec["alias"]]
+                elif kind == "remove_index":
+                    if spec["index"] not in indices:
+                        return 404, {"error": {"type": "index_not_found_exception"}}
+                    del indices[spec["index"]]
+            state.aliases = aliases
+            state.indices = indices
+        return 200, {"acknowledged": True}
+
+    def get_alias(self, name):
+        state = self.state
+        with state.lock:
+            target = state.aliases.get(name)
+        if target is None:
+            return 404, {"error": f"alias [{name}] missing", "status": 404}
+        return 200, {target: {"aliases": {name: {}}}}
+
+    def bulk(self, default_index, body):
+        """处理 NDJSON 格式的 _bulk 请求，按 reject_rate 随机拒绝部分文档"""
+        state = self.state
+        lines = [line for line in body.split(b"\n") if line.strip()]
+        items = []
+        errors = False
+        for action_line, doc_line in zip(lines[::2], lines[1::2]):
+            action = json.loads(action_line)["index"]
+            name = state.resolve(action.get("_index", default_index))
+            if state.should_reject():
+                errors = True
+                items.append({"index": {"_index": name, "_id": action.get("_id"), "status": 429,
+                                        "error": {"type": "es_rejected_execution_exception"}}})
+                continue
+            with state.lock:
+                index = state.indices.setdefault(name, {"settings": {}, "mappings": {}, "docs": {}})
+                index["docs"][action.get("_id")] = json.loads(doc_line)
+            items.append({"index": {"_index": name, "_id": action.get("_id"), "status": 201,
+                                    "result": "created"}})
+        return 200, {"took": 1, "errors": errors, "items": items}
+
+
+def start_es_standin(latency=0.0, reject_rate=0.0, seed=0):
+    """启动 Elasticsearch 替身，返回 (server, 地址 URL)；server.state 为内存状态"""
+    state = StandinState(latency, reject_rate, seed)
+    handler = type("Handler", (StandinHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
@@ -0,0 +1,73 @@
+"""本地测试夹具：在 127.0.0.1 上提供一个确定性的合成网站，用于离线测试和基准测试"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import hashlib
+import random
+import threading
+import time
+
+
+def build_site(num_pages=200, links_per_page=8, seed=0):
+    """生成合成网站的链接结构：{页面路径: [链接路径, ...]}"""
+    rng = random.Random(seed)
+    site = {}
+    for i in range(num_pages):
+        targets = [(i + 1) % num_pages]  # 保证所有页面都能从首页到达
+        targets += rng.sample(range(num_pages), min(links_per_page - 1, num_pages))
+        site[f"/page/{i}.html"] = [f"/page/{t}.html" for t in targets]
+    # 每个站点带几个下载链接，覆盖爬虫的下载链接分支
+    site["/page/0.html"].append("/files/report.pdf")
+    return site
+
+
+def render_page(path, links):
+    """将一个合成页面渲染为 HTML"""
+    anchors = "\n".join(f'<a href="{link}">链接 {link}</a>' for link in links)
+    return (f"<html><head><title>合成页面 {path}</title>"
+            f'<meta name="description" content="描述 {path}"></head>'
+            f"<body><p>正文 {path}</p>\n{anchors}\n</body></html>").encode("utf-8")
+
+
+def start_site_server(num_pages=200, links_per_page=8, latency=0.0, seed=0):
+    """启动合成网站服务器，返回 (server, 首页 URL)；latency 模拟每个请求的网络延迟（秒）
+
+    响应带有 ETag 并支持 If-None-Match；修改 server.pages 中的内容即可模拟页面更新。
+    """
+    site = build_site(num_pages, links_per_page, seed)
+    pages = {path: render_page(path, links) for path, links in site.items()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 支持 keep-alive，用于验证连接复用
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            body = pages.get(self.path)
+            if body is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.pages = pages
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/page/0.html"
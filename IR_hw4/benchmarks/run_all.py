@@ -0,0 +1,216 @@
+"""离线基准测试套件：依次测量抓取、索引、检索、PageRank 和重排序，汇总为一组指标，并与保存的基线比较
+
+全部使用本地夹具，不访问外网和真实的 Elasticsearch：
+    crawl     本地 HTTP 服务器提供的合成网站（fixtures.start_site_server），并发抓取的 pages/s
+    index     合成的爬取结果（bench_index.write_records）经 _bulk 写入 Elasticsearch 替身、建立本地 BM25 索引的 docs/s，
+              以及在同一份数据上，网站的查询体分别发给替身和本地索引（local_search.py）的 p50 / p99 延迟
+    pagerank  随机链接图上 calculate_pagerank_sparse 的耗时
+    rerank    web.search_with_recommendations 使用的 rerank.rerank（现场向量化 / 预先计算的文档向量）的 p50 / p99 延迟
+每个指标取 --repeat 次运行的中位数。与基线相比，吞吐量下降或耗时上升超过 --tolerance 时视为回退，退出码为 1；
+耗时的绝对变化小于 --min-delta 毫秒时视为噪声，不计为回退。
+基线与机器相关，不同规模（--quick）的结果不互相比较。
+
+用法（在 IR_hw4 目录下）：
+    python -m benchmarks.run_all --save-baseline      运行并保存为基线
+    python -m benchmarks.run_all                      运行并与基线比较
+    python -m benchmarks.run_all --only index,pagerank --quick
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from elasticsearch import Elasticsearch
+
+import catch_url
+import doc_vectors
+import es_createInex
+import local_search
+import query_cache
+import rerank
+import suggest
+from benchmarks import bench_rerank, bench_search
+from benchmarks.bench_crawl import run_crawl
+from benchmarks.bench_index import write_records
+from benchmarks.es_standin import start_es_standin
+from benchmarks.fixtures import start_site_server
+from link_graph import LinkGraph
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# 各测试的规模：默认 / --quick
+SIZES = {
+    "full": {"pages": 300, "docs": 5000, "queries": 200, "nodes": 50000, "rerank_queries": 200},
+    "quick": {"pages": 100, "docs": 1000, "queries": 50, "nodes": 5000, "rerank_queries": 50},
+}
+HIGHER_IS_BETTER = {"pages/s", "docs/s"}  # 其它单位（ms）越小越好
+
+
+def bench_crawl(size, tmp):
+    server, start_url = start_site_server(size["pages"], 8, latency=0.005)
+    catch_url.domain_keyword = "127.0.0.1"
+    catch_url.checkpoint_dir = None
+    catch_url.page_store_dir = os.path.join(tmp, "page_store")
+    catch_url.meta_file = os.path.join(tmp, "crawl_meta.jsonl")
+    try:
+        elapsed, pages, _, _ = run_crawl(start_url, 16)
+    finally:
+        server.shutdown()
+    return {"crawl.concurrent": (pages / elapsed, "pages/s")}
+
+
+def bench_index_and_search(size, tmp):
+    file_path = os.path.join(tmp, "urls_with_data.jsonl")
+    write_records(file_path, size["docs"])
+    rng = random.Random(0)
+    queries = [" ".join(rng.sample(bench_search.WORDS, rng.randint(1, 3))) for _ in range(size["queries"])]
+    patterns = bench_search.make_patterns(rng, size["queries"])
+    metrics = {}
+
+    server, url = start_es_standin(latency=0.002)
+    es_createInex.es = Elasticsearch(url)
+    try:
+        index = es_createInex.create_index()
+        start = time.perf_counter()
+        indexed, _ = es_createInex.index_data_to_elasticsearch(file_path, index=index, tune_for_bulk=True)
+        metrics["index.bulk"] = (indexed / (time.perf_counter() - start), "docs/s")
+        p50, p99 = bench_search.measure(es_createInex.es, index, queries)
+        metrics["search.es_standin.p50"], metrics["search.es_standin.p99"] = (p50, "ms"), (p99, "ms")
+    finally:
+        server.shutdown()
+
+    root = os.path.join(tmp, f"local_index_{time.time_ns()}")
+    os.makedirs(root)
+    start = time.perf_counter()
+    local_search.build_local_index(file_path, root)
+    metrics["index.local"] = (size["docs"] / (time.perf_counter() - start), "docs/s")
+    local = local_search.LocalSearch(root)
+    bench_search.measure(local, None, queries[:5])  # 第一次查询时加载词典
+    bench_search.measure(local, None, patterns[:5], use_wildcard=True)
+    for name, cases, use_wildcard in [("local", queries, False), ("local_wildcard", patterns, True)]:
+        p50, p99 = bench_search.measure(local, None, cases, use_wildcard)
+        metrics[f"search.{name}.p50"], metrics[f"search.{name}.p99"] = (p50, "ms"), (p99, "ms")
+    return metrics
+
+
+def bench_pagerank(size, tmp):
+    rng = random.Random(0)
+    nodes = size["nodes"]
+    graph = LinkGraph()
+    for i in range(nodes):
+        graph.add_links(f"https://www.nankai.edu.cn/{i}", [f"https://www.nankai.edu.cn/{rng.randrange(nodes)}"
+                                                          for _ in range(8)])
+    start = time.perf_counter()
+    catch_url.calculate_pagerank_sparse(graph)
+    return {"pagerank.sparse": ((time.perf_counter() - start) * 1000, "ms")}
+
+
+def bench_rerank_latency(size, tmp):
+    rng = random.Random(0)
+    cases = [bench_rerank.make_case(rng, 10, 5) for _ in range(size["rerank_queries"])]
+    metrics = {}
+    for name, func_cases in [("batched", cases), ("precomputed", bench_rerank.with_vectors(cases))]:
+        p50, p99 = bench_rerank.measure(rerank.rerank, func_cases)
+        metrics[f"rerank.{name}.p50"], metrics[f"rerank.{name}.p99"] = (p50, "ms"), (p99, "ms")
+    return metrics
+
+
+BENCHMARKS = {
+    "crawl": bench_crawl,
+    "index": bench_index_and_search,
+    "pagerank": bench_pagerank,
+    "rerank": bench_rerank_latency,
+}
+
+
+def run_suite(names, size, repeat):
+    """运行选中的测试 repeat 次，返回 {指标名: {"value": 中位数, "unit": 单位}}"""
+    samples, units = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # 建索引时写出的旁路文件和版本标记都放在临时目录中
+        doc_vectors.vectors_dir = os.path.join(tmp, "doc_vectors")
+        suggest.suggest_dir = os.path.join(tmp, "suggestions")
+        query_cache.version_file = os.path.join(tmp, "index_version.txt")
+        for name in names:
+            for _ in range(repeat):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    metrics = BENCHMARKS[name](size, tmp)
+                for metric, (value, unit) in metrics.items():
+                    samples.setdefault(metric, []).append(value)
+                    units[metric] = unit
+            print(f"finished {name}", file=sys.stderr)
+    return {metric: {"value": statistics.median(values), "unit": units[metric]}
+            for metric, values in samples.items()}
+
+
+def compare(results, baseline, tolerance, min_delta=0.0):
+    """打印结果及与基线的变化，返回回退的指标名列表"""
+    regressions = []
+    print(f"{'metric':28} {'value':>12} {'unit':8} {'baseline':>12} {'change':>8}")
+    for metric, result in results.items():
+        value, unit = result["value"], result["unit"]
+        base = baseline.get(metric, {}).get("value")
+        if base is None or base == 0:
+            print(f"{metric:28} {value:12.2f} {unit:8} {'-':>12} {'-':>8}")
+            continue
+        change = (value - base) / base
+        worse = -change if unit in HIGHER_IS_BETTER else change
+        status = ""
+        if worse > tolerance and (unit in HIGHER_IS_BETTER or abs(value - base) >= min_delta):
+            regressions.append(metric)
+            status = "  REGRESSION"
+        print(f"{metric:28} {value:12.2f} {unit:8} {base:12.2f} {change:+8.1%}{status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help=f"逗号分隔的测试名，可选 {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="使用较小的规模")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=default_baseline, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线（合并到已有的基线中）")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的变化比例，超过即视为回退")
+    parser.add_argument("--min-delta", type=float, default=0.5, help="耗时变化小于该毫秒数时不视为回退")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    scale = "quick" if args.quick else "full"
+    results = run_suite(names, SIZES[scale], args.repeat)
+
+    saved = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    baseline = saved.get(scale, {}).get("metrics", {})
+    regressions = compare(results, {} if args.save_baseline else baseline, args.tolerance, args.min_delta)
+
+    if args.save_baseline:
+        entry = saved.setdefault(scale, {"metrics": {}})
+        entry["metrics"].update(results)
+        entry.update({"saved": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+                      "machine": platform.platform()})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+        print(f"saved {len(results)} metrics to {args.baseline} ({scale})")
+    elif not baseline:
+        print(f"no {scale} baseline in {args.baseline}; run with --save-baseline to create one")
+    elif regressions:
+        print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    else:
+        print(f"no regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
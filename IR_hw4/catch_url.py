@@ -1,71 +1,121 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin, urlunparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import hashlib
+import json
+import threading
 import time
 import os
 import re
-from scipy.sparse import csr_matrix
 import numpy as np
 
+import metrics
+from link_graph import LinkGraph
+from page_store import PageStore
+from records import dumps_record, iter_records, attach_pagerank
+
 # 全局变量
-url_queue = []  # 待爬取的 URL 队列
+url_queue = deque()  # 待爬取的 URL 队列
 visited = set()  # 已访问的 URL 集合
-nankai_urls = []  # 符合条件的 URL 数据列表
-adj_list = {}  # 用于 PageRank 计算的邻接表
+record_count = 0  # 已收集的记录数（记录本身流式写入 output_file，不保存在内存中）
+link_graph = LinkGraph()  # 用于 PageRank 计算的链接图（URL 以整数 id 保存）
 max_urls = 100000  # 最大 URL 爬取数量限制
+concurrency = 1  # 同时进行的抓取数量，1 表示顺序抓取
+request_timeout = 1  # 单次请求超时时间（秒）
+domain_keyword = "nankai"  # 域名中必须包含的关键字
+max_content_length = 5000  # 每个页面保存的正文最大字符数
+checkpoint_dir = "crawl_checkpoint"  # 断点文件目录，None 表示不保存断点
+checkpoint_interval = 500  # 每处理多少个 URL 保存一次断点
+incremental = False  # 增量模式：使用条件请求和内容哈希跳过未变化的页面
+crawl_meta = {}  # 增量模式下上一次抓取的缓存索引：URL -> (ETag, Last-Modified, 内容哈希, 行位置, 行长度)（只读）
+changed_urls = set()  # 本次抓取中新增或内容有变化的记录 URL
+meta_file = "crawl_meta.jsonl"  # 抓取缓存文件，每次抓取都会写入，供下一次增量抓取使用；None 表示不写入
+output_file = "urls_with_data.jsonl"  # 爬取结果，每抓取一个页面追加一行 JSON
+changed_file = "urls_changed.jsonl"  # 增量模式下只包含新增或变化记录的输出文件
+pagerank_file = "pagerank_results.txt"  # 上一次的 PageRank 结果，用于热启动
+graph_dir = "link_graph"  # 链接图的 CSR 文件目录
+page_store_dir = "page_store"  # 原始网页存档目录（见 page_store.py），None 表示不保存原始网页
+page_store = None  # 抓取期间打开的 PageStore
+
+# HTML 解析器：安装了 lxml 时使用更快的 lxml，否则使用内置的 html.parser
+try:
+    import lxml  # noqa: F401
+    parser_backend = "lxml"
+except ImportError:
+    parser_backend = "html.parser"
+
+# 每个工作线程一个 Session，按主机复用 keep-alive 连接
+_thread_local = threading.local()
+
+# 断点日志：每处理完一个 URL 追加一行 JSON，state.json 记录已确认的日志长度和待爬队列
+_checkpoint_log = None
+_output = None
+_meta_output = None  # 本次抓取的缓存，逐条追加到 meta_file + ".partial"，抓取完成后替换 meta_file
+_since_checkpoint = 0
+_pending = set()  # 已出队但尚未写入断点日志的 URL
+
+
+def reset_state():
+    """清空爬虫的全局状态，便于在同一进程中多次爬取"""
+    global url_queue, visited, record_count, link_graph, _since_checkpoint, _pending
+    global crawl_meta, changed_urls
+    url_queue = deque()
+    visited = set()
+    record_count = 0
+    link_graph = LinkGraph()
+    crawl_meta = {}
+    changed_urls = set()
+    close_checkpoint()
+    _since_checkpoint = 0
+    _pending = set()
+
+
+def get_session():
+    """获取当前线程的 requests.Session，同一主机的连接会被复用"""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=max(concurrency, 10))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return session
+
 
 def check_nankai(url):
     """检查 URL 的域名是否包含 'nankai'"""
     parsed_url = urlparse(url)
     domain = parsed_url.netloc
-    return "nankai" in domain
-
-def fetch_page_data(url, index):
-    """从指定的 URL 提取页面数据，包括 title, description, 和 anchor_text"""
-    try:
-        response = requests.get(url, timeout=1)
-        if response.status_code != 200:
-            return None
+    return domain_keyword in domain
 
-        # 采用 UTF-8 解码
-        html = response.content.decode('utf-8', errors='ignore')
-        soup = BeautifulSoup(html, 'html.parser')
+def parse_page(html, base_url):
+    """只解析一次 HTML，同时提取链接、锚文本、标题、描述和正文
 
-        # 获取标题
-        title = soup.title.string.strip() if soup.title else ""
+    返回 (links, page_data)，其中 links 为 [(绝对 URL, 锚文本), ...]。
+    """
+    soup = BeautifulSoup(html, parser_backend)
 
-        # 获取描述
-        description = ""
-        meta_desc = soup.find('meta', attrs={"name": "description"})
-        if meta_desc and meta_desc.get("content"):
-            description = meta_desc.get("content").strip()
+    # 获取标题
+    title = (soup.title.string or "").strip() if soup.title else ""
 
-        # 获取前五个锚文本
-        anchor_text = []
-        for tag in soup.find_all('a', href=True):
-            text = tag.get_text(strip=True)
-            if text:
-                anchor_text.append(text)
-                if len(anchor_text) >= 5:  # 只保存前五个
-                    break
-
-        return {
-            "url": url,
-            "anchor_text": anchor_text,
-            "title": title,
-            "description": description,
-            "page_rank": 0  # PageRank 值默认设置为 0，稍后可修改
-        }
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
-        return None
+    # 获取描述
+    description = ""
+    meta_desc = soup.find('meta', attrs={"name": "description"})
+    if meta_desc and meta_desc.get("content"):
+        description = meta_desc.get("content").strip()
 
-def extract_links(html, base_url):
-    """从网页中提取所有链接"""
-    soup = BeautifulSoup(html, 'html.parser')
     links = []
-
+    anchor_text = []
     for tag in soup.find_all('a', href=True):
+        text = tag.get_text(strip=True)
+        # 获取前五个锚文本
+        if text and len(anchor_text) < 5:
+            anchor_text.append(text)
+
         href = tag.get('href')
         if href.startswith('#') or "javascript:" in href or not href:
             continue
@@ -75,119 +125,567 @@ def extract_links(html, base_url):
             continue
         # 清理 URL，去除查询和片段
         cleaned_url = urlunparse(parsed_url._replace(query="", fragment=""))
-        text = tag.get_text(strip=True)
         links.append((cleaned_url, text))
-    return links
 
-def crawl_urls(start_url):
-    """爬取域名中包含 'nankai' 的 URL"""
-    global url_queue, visited, nankai_urls, adj_list
+    # 获取正文（去掉脚本和样式）
+    for tag in soup(['script', 'style']):
+        tag.decompose()
+    body = soup.body or soup
+    content = body.get_text(" ", strip=True)[:max_content_length]
 
-    url_queue.append(start_url)
+    page_data = {
+        "url": base_url,
+        "anchor_text": anchor_text,
+        "title": title,
+        "description": description,
+        "content": content,
+        "page_rank": 0  # PageRank 值默认设置为 0，稍后可修改
+    }
+    return links, page_data
 
-    while url_queue and len(nankai_urls) < max_urls:
-        url = url_queue.pop(0)
+
+def fetch_page_data(url, index):
+    """从指定的 URL 提取页面数据，包括 title, description, 和 anchor_text"""
+    try:
+        response = get_session().get(url, timeout=request_timeout)
+        if response.status_code != 200:
+            return None
+
+        # 采用 UTF-8 解码
+        html = response.content.decode('utf-8', errors='ignore')
+        _, page_data = parse_page(html, url)
+        return page_data
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        return None
+
+def extract_links(html, base_url):
+    """从网页中提取所有链接"""
+    links, _ = parse_page(html, base_url)
+    return links
+
+def process_url(url):
+    """抓取并解析单个 URL，返回 (链接列表, 页面数据, 缓存信息)，非 200/304 响应返回 None
+
+    每个页面只请求一次、解析一次。增量模式下对已抓取过的 URL 发送条件请求，
+    304 或内容哈希未变化时直接复用上次的解析结果，不再解析页面。
+    该函数可以在工作线程中运行，不会修改任何全局状态。
+    """
+    cached = crawl_meta.get(url) if incremental else None
+    headers = {}
+    if cached:
+        if cached[0]:
+            headers["If-None-Match"] = cached[0]
+        if cached[1]:
+            headers["If-Modified-Since"] = cached[1]
+
+    # 发送 GET 请求获取页面内容
+    with metrics.timer("crawl_stage", stage="fetch"):
+        response = get_session().get(url, timeout=request_timeout, headers=headers)
+    metrics.inc("crawl_responses_total", status=response.status_code)
+    if cached and response.status_code == 304:
+        info = {"etag": cached[0], "last_modified": cached[1], "hash": cached[2]}
+        return read_cached_parse(cached) + (dict(info, changed=False),)
+    if response.status_code != 200:
+        return None
+
+    raw_html = response.content
+    info = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "hash": hashlib.sha1(raw_html).hexdigest(),
+    }
+    if page_store is not None:
+        # 内容相同的页面在存档中只保存一份
+        with metrics.timer("crawl_stage", stage="store"):
+            page_store.put(url, raw_html, response.headers.get("Content-Type"), info["hash"])
+    if cached and cached[2] == info["hash"]:
+        return read_cached_parse(cached) + (dict(info, changed=False),)
+
+    with metrics.timer("crawl_stage", stage="parse"):
+        html = raw_html.decode('utf-8', errors='ignore')
+        links, page_data = parse_page(html, url)
+    return links, page_data, dict(info, changed=True)
+
+
+def split_links(links, page_data):
+    """把页面的链接分为下载链接和页面链接，返回 (数据记录, 页面链接)"""
+    download_links = []  # 存储下载链接
+    page_links = []  # 存储页面链接
+
+    # 分类链接为下载链接和页面链接
+    for link, anchor in links:
+        if any(ext in link for ext in ['pdf', 'zip', 'doc', 'excel', 'mp4']):
+            download_links.append((link, anchor))
+        else:
+            page_links.append((link, anchor))
+
+    records = []
+
+    # 处理下载链接
+    for download_link, anchor in download_links:
+        records.append({
+            "url": download_link,
+            "anchor_text": [anchor],
+            "title": anchor or "Download Link",
+            "description": "",
+            "page_rank": 0
+        })
+    if page_data:
+        records.append(page_data)
+    return records, page_links
+
+
+def merge_page(url, links, page_data, info):
+    """将一个页面的抓取结果合并到全局状态中（只在主线程中调用），返回新增的数据记录"""
+    global record_count
+    records, page_links = split_links(links, page_data)
+
+    # 处理页面链接
+    link_graph.add_links(url, [link for link, _ in page_links])  # 仅存储页面链接用于 PageRank
+    for link, _ in page_links:
+        if link not in visited and check_nankai(link):
+            url_queue.append(link)
+    record_count += len(records)
+
+    # 页面内容有变化时其产生的记录都需要重新索引
+    if info.get("changed", True):
+        changed_urls.update(record["url"] for record in records)
+    return records
+
+
+def handle_page(url, links, page_data, info):
+    """合并一个页面的抓取结果，把记录写入输出文件，并写入断点日志"""
+    records = merge_page(url, links, page_data, info)
+    first = record_count - len(records) + 1
+    for i, record in enumerate(records):
+        if _output is not None:
+            _output.write(dumps_record(record))
+        kind = "URL" if record is page_data else "download URL"
+        print(f"[GET] Add {kind}: {first + i} {record['url']}")
+    if _meta_output is not None:
+        # 缓存信息直接写入文件，不保存在内存中
+        entry = {"url": url, "etag": info.get("etag"), "last_modified": info.get("last_modified"),
+                 "hash": info.get("hash"), "links": links, "page_data": page_data}
+        _meta_output.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    log_visit({"url": url, "links": links, "page_data": page_data, "meta": info})
+
+
+def log_visit(event):
+    """把一个已处理的 URL 追加到断点日志中"""
+    global _since_checkpoint
+    _pending.discard(event["url"])
+    if _checkpoint_log is None:
+        return
+    _checkpoint_log.write(json.dumps(event, ensure_ascii=False) + "\n")
+    _since_checkpoint += 1
+
+
+def save_checkpoint():
+    """落盘断点：先同步日志和输出文件，再原子地替换 state.json
+
+    已出队但结果尚未写入日志的 URL（如并发抓取中的请求）会被放回待爬队列。
+    """
+    global _since_checkpoint
+    if _checkpoint_log is None:
+        return
+    output_offset = _sync(_output)
+    meta_offset = _sync(_meta_output)
+    if page_store is not None:
+        page_store.flush(sync=True)
+    _checkpoint_log.flush()
+    os.fsync(_checkpoint_log.fileno())
+
+    frontier = list(_pending)
+    seen = set(frontier)
+    for url in url_queue:
+        if url not in visited and url not in seen:
+            seen.add(url)
+            frontier.append(url)
+
+    state = {"log_offset": _checkpoint_log.tell(), "output_offset": output_offset,
+             "meta_offset": meta_offset, "frontier": frontier, "time": time.time()}
+    state_file = os.path.join(checkpoint_dir, "state.json")
+    with open(state_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(state_file + ".tmp", state_file)
+    _since_checkpoint = 0
+    print(f"[CHECKPOINT] visited={len(visited)} collected={record_count} frontier={len(frontier)}")
+
+
+def _sync(f):
+    """把文件落盘，返回当前长度（f 为 None 时返回 0）"""
+    if f is None:
+        return 0
+    f.flush()
+    os.fsync(f.fileno())
+    return f.tell()
+
+
+def maybe_checkpoint():
+    """每处理 checkpoint_interval 个 URL 保存一次断点"""
+    if _checkpoint_log is not None and _since_checkpoint >= checkpoint_interval:
+        save_checkpoint()
+
+
+def _open_for_append(path, offset=None):
+    """恢复时截断到断点确认的位置继续追加，否则重新写入；path 为 None 时返回 None"""
+    if path is None:
+        return None
+    if offset is not None and os.path.exists(path):
+        with open(path, "r+", encoding="utf-8") as f:
+            f.truncate(offset)
+        return open(path, "a", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def open_output(offset=None, meta_offset=None):
+    """打开记录输出文件和本次抓取的缓存文件"""
+    global _output, _meta_output
+    _output = _open_for_append(output_file, offset)
+    _meta_output = _open_for_append(meta_file and meta_file + ".partial", meta_offset)
+
+
+def publish_meta():
+    """抓取完成后用本次的缓存替换 meta_file（未再次抓取到的页面不保留）"""
+    if meta_file is not None and os.path.exists(meta_file + ".partial"):
+        os.replace(meta_file + ".partial", meta_file)
+
+
+def open_checkpoint(resume=False):
+    """打开断点日志和输出文件；resume 为 True 时先从上一次断点恢复全局状态
+
+    返回是否成功恢复。日志和输出文件中超出 state.json 记录长度的部分是未确认的，会被丢弃。
+    """
+    global _checkpoint_log
+    if checkpoint_dir is None:
+        open_output()
+        return False
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    log_file = os.path.join(checkpoint_dir, "log.jsonl")
+    state_file = os.path.join(checkpoint_dir, "state.json")
+
+    if not (resume and os.path.exists(state_file) and os.path.exists(log_file)):
+        for path in (log_file, state_file):
+            if os.path.exists(path):
+                os.remove(path)
+        _checkpoint_log = open(log_file, "a", encoding="utf-8")
+        open_output()
+        return False
+
+    with open(state_file, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    with open(log_file, "r+", encoding="utf-8") as f:
+        f.truncate(state["log_offset"])
+    with open(log_file, "r", encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            visited.add(event["url"])
+            if "links" in event:
+                merge_page(event["url"], event["links"], event["page_data"], event["meta"])
+    url_queue.clear()
+    url_queue.extend(state["frontier"])
+
+    _checkpoint_log = open(log_file, "a", encoding="utf-8")
+    open_output(state["output_offset"], state.get("meta_offset"))
+    print(f"[RESUME] visited={len(visited)} collected={record_count} frontier={len(url_queue)}")
+    return True
+
+
+def close_checkpoint():
+    """关闭断点日志、输出文件和缓存文件"""
+    global _checkpoint_log, _output, _meta_output
+    for f in (_checkpoint_log, _output, _meta_output):
+        if f is not None:
+            f.close()
+    _checkpoint_log = _output = _meta_output = None
+
+
+def crawl_sequential():
+    """顺序抓取：一次只有一个请求在进行"""
+    while url_queue and record_count < max_urls:
+        url = url_queue.popleft()
         if url in visited:
             continue
         visited.add(url)
+        _pending.add(url)
 
         try:
-            # 发送 GET 请求获取页面内容
-            response = requests.get(url, timeout=1)
-            if response.status_code != 200:
-                continue
-
-            raw_html = response.content
-            html = raw_html.decode('utf-8', errors='ignore')
-
-            # 提取所有链接并分类
-            links = extract_links(html, url)
-            download_links = []  # 存储下载链接
-            page_links = []  # 存储页面链接
-
-            # 分类链接为下载链接和页面链接
-            for link, anchor in links:
-                content_type = response.headers.get('Content-Type', '').lower()
-                if any(ext in link for ext in ['pdf', 'zip', 'doc', 'excel', 'mp4']):
-                    download_links.append((link, anchor))
-                else:
-                    page_links.append((link, anchor))
-
-            # 处理下载链接
-            for download_link, anchor in download_links:
-                nankai_urls.append({
-                    "url": download_link,
-                    "anchor_text": [anchor],
-                    "title": anchor or "Download Link",
-                    "description": "",
-                    "page_rank": 0
-                })
-                print(f"[GET] Add download URL: {len(nankai_urls)} {download_link}")
-
-            # 处理页面链接
-            adj_list[url] = [link for link, _ in page_links]  # 仅存储页面链接用于 PageRank
-            for link, _ in page_links:
-                if link not in visited and check_nankai(link):
-                    url_queue.append(link)
-
-            # 提取页面数据
-            page_data = fetch_page_data(url, len(nankai_urls) + 1)
-            if page_data:
-                nankai_urls.append(page_data)
-                print(f"[GET] Add URL: {len(nankai_urls)} {url}")
-
+            result = process_url(url)
         except Exception as e:
             print(f"Error fetching {url}: {e}")
-            continue
+            metrics.inc("crawl_errors_total", reason=type(e).__name__)
+            result = None
+        if result:
+            handle_page(url, *result)
+        else:
+            log_visit({"url": url})
+        metrics.set_gauge("crawl_queue_depth", len(url_queue))
+        maybe_checkpoint()
+
+
+def crawl_concurrent(workers):
+    """并发抓取：最多 workers 个请求同时进行，结果统一在主线程中合并"""
+    in_flight = {}  # future -> url
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # 补满并发窗口
+            while url_queue and len(in_flight) < workers and record_count < max_urls:
+                url = url_queue.popleft()
+                if url in visited:
+                    continue
+                visited.add(url)
+                _pending.add(url)
+                in_flight[executor.submit(process_url, url)] = url
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error fetching {url}: {e}")
+                    metrics.inc("crawl_errors_total", reason=type(e).__name__)
+                    result = None
+                if result:
+                    handle_page(url, *result)
+                else:
+                    log_visit({"url": url})
+            metrics.set_gauge("crawl_queue_depth", len(url_queue))
+            metrics.set_gauge("crawl_in_flight", len(in_flight))
+            maybe_checkpoint()
+
+
+def crawl_urls(start_url, workers=None, resume=False):
+    """爬取域名中包含 'nankai' 的 URL
+
+    workers 为同时进行的抓取数量，默认使用全局变量 concurrency；
+    大于 1 时使用线程池并发抓取，输出的记录和 link_graph 与顺序抓取一致。
+    resume 为 True 时从 checkpoint_dir 中的断点继续，已抓取的 URL 不会重新请求。
+    记录在抓取过程中逐条写入 output_file，返回记录总数。
+    """
+    global page_store
+    workers = workers or concurrency
+    start_time = time.time()
 
-    print(f"Total nankai URLs collected: {len(nankai_urls)}")
-    return nankai_urls
+    if page_store_dir is not None and page_store is None:
+        page_store = PageStore(page_store_dir)
+    if not open_checkpoint(resume):
+        url_queue.append(start_url)
+    try:
+        if workers > 1:
+            crawl_concurrent(workers)
+        else:
+            crawl_sequential()
+    except KeyboardInterrupt:
+        save_checkpoint()
+        close_checkpoint()
+        print("Crawl interrupted, run with --resume to continue from the checkpoint.")
+        raise
+    finally:
+        if page_store is not None:
+            page_store.close()
+            page_store = None
+    save_checkpoint()
+    close_checkpoint()
+    publish_meta()
+
+    elapsed = time.time() - start_time
+    pages_per_second = len(visited) / elapsed if elapsed > 0 else 0.0
+    metrics.set_gauge("crawl_pages", len(visited))
+    metrics.set_gauge("crawl_records", record_count)
+    metrics.set_gauge("crawl_pages_per_second", round(pages_per_second, 2))
+    print(f"Total nankai URLs collected: {record_count}")
+    print(f"Fetched {len(visited)} pages in {elapsed:.2f} seconds "
+          f"({pages_per_second:.1f} pages/s, workers={workers})")
+    return record_count
+
+def load_crawl_meta(file_path):
+    """加载增量抓取的缓存索引（每行一个 JSON，后出现的覆盖先出现的）
+
+    内存中只保留 ETag、Last-Modified、内容哈希和该行在文件中的位置，
+    链接列表和页面数据在需要时由 read_cached_parse 按位置读取。
+    """
+    meta = {}
+    if file_path is not None and os.path.exists(file_path):
+        with open(file_path, "rb") as f:
+            offset = 0
+            for line in f:
+                entry = json.loads(line)
+                meta[entry["url"]] = (entry.get("etag"), entry.get("last_modified"), entry.get("hash"),
+                                      offset, len(line))
+                offset += len(line)
+    return meta
+
+
+def read_cached_parse(cached):
+    """按 crawl_meta 中记录的位置从上一次的缓存文件读取解析结果，返回 (链接列表, 页面数据)
+
+    本次抓取的缓存写入 meta_file + ".partial"，抓取结束后才替换 meta_file，
+    所以抓取期间 meta_file 仍是加载 crawl_meta 时的文件，位置有效。
+    """
+    with open(meta_file, "rb") as f:
+        f.seek(cached[3])
+        entry = json.loads(f.read(cached[4]))
+    return entry["links"], entry["page_data"]
+
+
+def calculate_pagerank_sparse(graph, damping=0.85, max_iterations=100, tol=1.0e-6,
+                              init_rank=None, return_stats=False):
+    """使用稀疏矩阵优化 PageRank 计算
+
+    graph 为 LinkGraph（也可以是 {URL: [链接 URL, ...]} 形式的邻接表）。
+    未被抓取的链接目标也作为节点参与计算；没有出链的悬挂节点把自身的分数平均分给所有节点。
+    init_rank 为上一次的结果 {url: score}（例如 load_pagerank 读取的 pagerank_results.txt），
+    用作迭代初值：图只有少量变化时只需几次迭代即可收敛。
+    return_stats 为 True 时额外返回 {"iterations", "residuals", "converged"}。
+    """
+    if not isinstance(graph, LinkGraph):
+        graph = LinkGraph.from_adj_list(graph)
+    num_nodes = len(graph)
+    urls = graph.urls
+    if num_nodes == 0:
+        # 例如起始 URL 无法访问时图为空
+        scores, stats = {}, {"iterations": 0, "residuals": [], "converged": True}
+        return (scores, stats) if return_stats else scores
+
+    A = graph.to_matrix()  # A[i, j] 为 i 指向 j 的链接数
+    out_degree = np.asarray(A.sum(axis=1)).flatten()
+    dangling = out_degree == 0
+    inv_degree = np.zeros(num_nodes)
+    inv_degree[~dangling] = 1.0 / out_degree[~dangling]
+    M_T = A.T  # 转置为 CSC 视图，不复制数据
+
+    if init_rank:
+        # 新增的节点使用均匀初值，再整体归一化
+        rank = np.array([init_rank.get(url, 1.0 / num_nodes) for url in urls], dtype=float)
+        rank /= rank.sum()
+    else:
+        rank = np.ones(num_nodes) / num_nodes
+
+    residuals = []
+    converged = False
+    for iteration in range(max_iterations):
+        dangling_mass = rank[dangling].sum()
+        new_rank = damping * (M_T.dot(rank * inv_degree) + dangling_mass / num_nodes) + (1 - damping) / num_nodes
+        residuals.append(float(np.abs(new_rank - rank).sum()))
+        rank = new_rank
+        if residuals[-1] < tol:
+            converged = True
+            break
 
-def calculate_pagerank_sparse(adj_list, damping=0.85, max_iterations=100, tol=1.0e-6):
-    """使用稀疏矩阵优化 PageRank 计算"""
-    nodes = list(adj_list.keys())
-    num_nodes = len(nodes)
-    node_index = {node: i for i, node in enumerate(nodes)}
+    scores = dict(zip(urls, rank.tolist()))
+    if return_stats:
+        return scores, {"iterations": len(residuals), "residuals": residuals, "converged": converged}
+    return scores
 
-    row, col, data = [], [], []
-    for node, links in adj_list.items():
-        node_idx = node_index[node]
-        for link in links:
-            if link in node_index:
-                row.append(node_index[link])
-                col.append(node_idx)
-                data.append(1)
 
-    M = csr_matrix((data, (row, col)), shape=(num_nodes, num_nodes))
-    out_degree = np.array(M.sum(axis=0)).flatten()
-    out_degree[out_degree == 0] = 1
-    M = M.multiply(1 / out_degree)
+def load_pagerank(file_path):
+    """读取 save_pagerank 写出的 PageRank 结果（每行 "URL: ..., PageRank: ..."）"""
+    scores = {}
+    if os.path.exists(file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line.startswith("URL: ") or ", PageRank: " not in line:
+                    continue
+                url, score = line[len("URL: "):].rsplit(", PageRank: ", 1)
+                scores[url] = float(score)
+    return scores
 
-    rank = np.ones(num_nodes) / num_nodes
 
-    for iteration in range(max_iterations):
-        new_rank = (1 - damping) / num_nodes + damping * M.dot(rank)
-        if np.linalg.norm(new_rank - rank, 1) < tol:
-            break
-        rank = new_rank
+def save_pagerank(scores, file_path):
+    """保存 PageRank 结果，供下一次计算热启动"""
+    with open(file_path, "w", encoding="utf-8") as f:
+        for url, score in scores.items():
+            f.write(f"URL: {url}, PageRank: {score}\n")
 
-    return {nodes[i]: rank[i] for i in range(num_nodes)}
 
-def cu():
+def reextract(file_path=None, store_dir=None):
+    """从原始网页存档重新解析所有页面并写入 file_path（默认 output_file），不重新爬取
+
+    解析规则修改后用于重新生成记录；PageRank 使用 pagerank_file 中上一次的结果。返回记录数。
+    """
+    file_path = file_path or output_file
+    store = PageStore(store_dir or page_store_dir)
+    start_time = time.time()
+    count = 0
+    with open(file_path, "w", encoding="utf-8") as out:
+        for url in store.urls():
+            content = store.get(url)
+            links, page_data = parse_page(content.decode('utf-8', errors='ignore'), url)
+            records, _ = split_links(links, page_data)
+            for record in records:
+                out.write(dumps_record(record))
+            count += len(records)
+    attach_pagerank(file_path, load_pagerank(pagerank_file))
+    print(f"Re-extracted {count} records from {len(store)} archived pages into {file_path} "
+          f"in {time.time() - start_time:.2f} seconds")
+    return count
+
+
+def cu(workers=None, resume=False, incremental_mode=False):
+    """爬取并计算 PageRank，结果写入 output_file
+
+    incremental_mode 为 True 时使用上次的缓存进行增量抓取，
+    并把新增或变化的记录另外写入 changed_file，供索引程序只更新这些文档。
+    """
+    global incremental, crawl_meta
     start_time = time.time()
     start_url = "https://www.nankai.edu.cn"
-    nankai_urls_data = crawl_urls(start_url)
-
-    pagerank_scores = calculate_pagerank_sparse(adj_list)
-
-    for entry in nankai_urls_data:
-        entry["page_rank"] = pagerank_scores.get(entry["url"], 0)
-
-    with open("urls_with_data.txt", "w", encoding="utf-8") as f:
-        for entry in nankai_urls_data:
-            f.write(f"{entry}\n")
+    incremental = incremental_mode
+    crawl_meta = load_crawl_meta(meta_file) if incremental else {}
+    crawl_urls(start_url, workers, resume)
+
+    # 使用上一次的 PageRank 结果热启动
+    previous_scores = load_pagerank(pagerank_file)
+    link_graph.save(graph_dir)
+    with metrics.timer("crawl_stage", stage="pagerank"):
+        pagerank_scores, stats = calculate_pagerank_sparse(link_graph, init_rank=previous_scores,
+                                                           return_stats=True)
+    save_pagerank(pagerank_scores, pagerank_file)
+    print(f"PageRank: {stats['iterations']} iterations, final residual "
+          f"{stats['residuals'][-1] if stats['residuals'] else 0:.2e}, "
+          f"warm start from {len(previous_scores)} scores")
+
+    # 第二遍流式处理，为每条记录写入 PageRank
+    attach_pagerank(output_file, pagerank_scores)
+
+    if incremental:
+        with open(changed_file, "w", encoding="utf-8") as f:
+            for entry in iter_records(output_file):
+                if entry["url"] in changed_urls:
+                    f.write(dumps_record(entry))
+        print(f"Incremental crawl: {len(changed_urls)} new or changed records written to {changed_file}")
 
     print(f"Crawling and PageRank computation completed in {time.time() - start_time:.2f} seconds.")
-
-
-cu()
\ No newline at end of file
+    metrics.write_summary("crawl", {"elapsed_seconds": round(time.time() - start_time, 3),
+                                    "incremental": incremental, "pagerank_iterations": stats['iterations']})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="爬取南开大学网站并计算 PageRank")
+    parser.add_argument("--concurrency", type=int, default=concurrency, help="同时进行的抓取数量")
+    parser.add_argument("--parser", default=parser_backend, help="BeautifulSoup 解析器，如 lxml 或 html.parser")
+    parser.add_argument("--resume", action="store_true", help="从上一次保存的断点继续爬取")
+    parser.add_argument("--incremental", action="store_true", help="增量抓取，只输出新增或变化的页面")
+    parser.add_argument("--checkpoint-dir", default=checkpoint_dir, help="断点文件目录")
+    parser.add_argument("--checkpoint-interval", type=int, default=checkpoint_interval,
+                        help="每处理多少个 URL 保存一次断点")
+    parser.add_argument("--page-store", default=page_store_dir, help="原始网页存档目录")
+    parser.add_argument("--reextract", action="store_true", help="不爬取，从原始网页存档重新生成记录")
+    args = parser.parse_args()
+    parser_backend = args.parser
+    checkpoint_dir = args.checkpoint_dir
+    checkpoint_interval = args.checkpoint_interval
+    page_store_dir = args.page_store
+    if args.reextract:
+        reextract()
+    else:
+        cu(args.concurrency, args.resume, args.incremental)
@@ -0,0 +1,185 @@
+"""基于 SimHash 的近似重复检测
+
+对 标题 + 描述 + 完整正文 取长度为 shingle_size 的字符 shingle 计算 64 位 SimHash，
+汉明距离不超过 max_distance 的两篇文档视为近似重复。正文开头通常是各页面共有的导航文字，
+只取前面一段会把内容不同的页面误判为重复，因此使用全部正文（爬虫已限制正文长度）。
+shingle 的哈希在 numpy 中整体计算，只取决于文本本身，每次运行保留的文档相同。
+64 位指纹被切分为 max_distance + 1 段，近似重复的指纹至少有一段完全相同，
+因此只需在相同段值的候选中比较。所有结构都有容量上限，内存占用是有界的。
+iter_deduplicated 用这些结构对爬取结果流式去重，Elasticsearch 索引和本地索引（local_search.py）共用。
+"""
+from collections import deque
+
+import numpy as np
+
+from records import iter_records
+
+shingle_size = 4  # 字符 shingle 的长度；二元组在词汇较少的中文页面之间区分度太低
+default_max_distance = 3  # SimHash 汉明距离不超过该值视为近似重复
+min_shingles = 20  # 文本的 shingle 数少于该值时只按 URL 去重
+default_capacity = 1_000_000  # 去重时最多保存的 URL / 指纹数量
+batch_size = 256  # 每批计算指纹的记录数
+batch_chars = 1 << 17  # 每批记录的最多字符数，限制计算指纹时的临时内存
+
+
+# 每个字节值的 8 个比特（低位在前），用于把按字节值的计数换算为按位的计数
+_byte_bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little").astype(np.int64)
+
+
+def _mix64(x):
+    """splitmix64 的混合函数，把多项式哈希打散为均匀的 64 位值（uint64 数组，溢出即取模）"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def fingerprints(texts, size=None):
+    """批量计算多篇文本（忽略空白）的 64 位 SimHash，返回 (指纹数组, 每篇的 shingle 数数组)
+
+    所有文本的码点拼接为一个数组，一次算出全部 shingle 的多项式哈希（丢弃跨越两篇文本的 shingle），
+    再统计每篇文本每一位的投票，numpy 调用的开销由整批文本分摊；shingle 按出现次数加权。
+    投票不逐位展开：先按 (文本, 字节位置, 字节值) 计数，再乘以每个字节值的比特表，
+    每个 shingle 只需计数 8 次而不是 64 次。
+    与内置的 hash 不同，结果不受 PYTHONHASHSEED 影响。
+    """
+    size = size or shingle_size
+    arrays = [np.frombuffer("".join(text.split()).encode("utf-32-le"), dtype="<u4") for text in texts]
+    lengths = np.array([len(codes) for codes in arrays], dtype=np.int64)
+    counts = np.maximum(lengths - size + 1, 0)
+    if not counts.any():
+        return np.zeros(len(texts), dtype=np.uint64), counts
+    codes = np.concatenate(arrays).astype(np.uint64)
+    total = len(codes) - size + 1
+    hashes = codes[:total]
+    for i in range(1, size):
+        hashes = hashes * np.uint64(0x100000001B3) + codes[i:i + total]
+    # 第 d 篇文本的 shingle 位于拼接数组的 starts[d] .. starts[d] + counts[d] - 1
+    starts = np.cumsum(lengths) - lengths
+    offsets = np.cumsum(counts) - counts
+    keep = np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+    hashes = _mix64(hashes[keep])
+
+    num_texts = len(texts)
+    text_ids = np.repeat(np.arange(num_texts), counts)
+    slots = (text_ids[:, None] * 8 + np.arange(8)) * 256 + hashes.astype("<u8").view(np.uint8).reshape(-1, 8)
+    byte_counts = np.bincount(slots.ravel(), minlength=num_texts * 8 * 256).reshape(num_texts * 8, 256)
+    ones = (byte_counts @ _byte_bits).reshape(num_texts, 64)  # 每篇文本每一位为 1 的 shingle 数
+    votes = ones * 2 - counts[:, None]
+    return np.packbits(votes > 0, axis=1, bitorder="little").view("<u8").ravel(), counts
+
+
+class BoundedSet:
+    """容量有限的集合，超出容量时淘汰最早加入的元素"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = set()
+        self._order = deque()
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def add(self, item):
+        if item in self._items:
+            return
+        self._items.add(item)
+        self._order.append(item)
+        if len(self._order) > self.capacity:
+            self._items.discard(self._order.popleft())
+
+
+class NearDuplicateFilter:
+    """SimHash 近似重复过滤器，最多保存 capacity 个指纹"""
+
+    def __init__(self, max_distance=3, capacity=1_000_000):
+        self.max_distance = max_distance
+        self.capacity = capacity
+        self.num_bands = max_distance + 1
+        self.band_bits = 64 // self.num_bands
+        self._bands = {}  # (段号, 段值) -> [指纹, ...]
+        self._order = deque()
+
+    def _keys(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(i, (fingerprint >> (i * self.band_bits)) & mask) for i in range(self.num_bands)]
+
+    def is_duplicate(self, fingerprint):
+        """是否与已保存的某个指纹近似重复"""
+        for key in self._keys(fingerprint):
+            for other in self._bands.get(key, ()):
+                if (fingerprint ^ other).bit_count() <= self.max_distance:
+                    return True
+        return False
+
+    def add(self, fingerprint):
+        for key in self._keys(fingerprint):
+            self._bands.setdefault(key, []).append(fingerprint)
+        self._order.append(fingerprint)
+        if len(self._order) > self.capacity:
+            oldest = self._order.popleft()
+            for key in self._keys(oldest):
+                bucket = self._bands[key]
+                bucket.remove(oldest)
+                if not bucket:
+                    del self._bands[key]
+
+    def check_and_add(self, fingerprint):
+        """判断是否重复；不重复时保存该指纹"""
+        if self.is_duplicate(fingerprint):
+            return True
+        self.add(fingerprint)
+        return False
+
+
+def iter_deduplicated(file_path, max_distance=None, capacity=None):
+    """逐条读取爬取结果并去重的生成器，记录直接交给索引流程，不在内存中整体保存
+
+    URL 完全相同的记录只保留第一条；标题 + 描述 + 正文足够长的记录再用 SimHash 检测近似重复，
+    因此标题相同但内容不同的页面不会被误删。指纹每 batch_size 条记录批量计算一次，
+    去重结构的容量有上限，内存占用是有界的。
+    """
+    max_distance = default_max_distance if max_distance is None else max_distance
+    capacity = capacity or default_capacity
+    seen_urls = BoundedSet(capacity)
+    near_duplicates = NearDuplicateFilter(max_distance, capacity)
+    skipped = 0
+
+    def near_unique(batch):
+        """批量计算一批记录的指纹，再按原来的顺序逐条检测近似重复，返回保留的记录"""
+        nonlocal skipped
+        hashes, counts = fingerprints([text for _, text in batch])
+        kept = []
+        for (record, _), fingerprint, count in zip(batch, hashes.tolist(), counts.tolist()):
+            # 文本太短（如只有锚文本的下载链接）时 SimHash 不可靠，只按 URL 去重
+            if count >= min_shingles and near_duplicates.check_and_add(fingerprint):
+                skipped += 1
+            else:
+                kept.append(record)
+        return kept
+
+    batch, chars = [], 0
+    for record in iter_records(file_path):
+        url = record.get('url')
+        if not url or url in seen_urls:
+            skipped += 1
+            continue
+        seen_urls.add(url)
+
+        text = " ".join([record.get('title') or "", record.get('description') or "",
+                         record.get('content') or ""])
+        batch.append((record, text))
+        chars += len(text)
+        if len(batch) >= batch_size or chars >= batch_chars:
+            yield from near_unique(batch)
+            batch, chars = [], 0
+    if batch:
+        yield from near_unique(batch)
+
+    print(f"Skipped {skipped} duplicate records from {file_path}")
+
+
+def load_and_deduplicate(file_path):
+    """加载并去重数据，返回列表（记录格式见 records.py，兼容旧版的 dict repr 格式）"""
+    return list(iter_deduplicated(file_path))
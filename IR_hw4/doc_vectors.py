@@ -0,0 +1,232 @@
+"""索引时预先计算的文档向量（内存映射的旁路文件）
+
+建索引时把每篇文档的 标题 + 描述 + 锚文本 用固定词表（特征哈希）转换为稀疏向量，
+在全部文档上统计 IDF，加权并 L2 归一化后按文档 id 排序保存为 CSR 文件：
+    ids.npy      排好序的文档 id（sha1，S40）
+    indptr.npy / indices.npy / data.npy   CSR 结构
+    idf.npy      每个哈希特征的 IDF
+每个版本索引对应 vectors_dir 下的一个同名目录。检索时只需对查询和历史记录做向量化，
+结果文档的向量直接从内存映射的文件中读取；旁路文件中没有的文档（如增量更新新增的）
+用同一个词表和 IDF 现场计算。增量更新改写的文档 id 记录在同一目录的 stale.npy 中，
+这些文档的旧向量已过期，同样现场计算。
+"""
+import os
+import shutil
+import threading
+
+import numpy as np
+
+vectors_dir = "doc_vectors"  # 旁路文件的根目录，每个版本索引一个子目录
+n_features = 2 ** 18  # 固定词表大小（哈希桶数）
+batch_size = 1000  # 建索引时每批向量化的文档数
+
+_vectorizer = None
+
+_stores = {}  # 版本索引名 -> DocVectors（None 表示没有旁路文件）
+_stores_lock = threading.Lock()
+
+
+def doc_text(source):
+    """文档向量使用的文本：标题 + 描述 + 锚文本"""
+    anchors = source.get('anchor_text') or []
+    if isinstance(anchors, str):
+        anchors = [anchors]
+    return " ".join([source.get('title') or "", source.get('description') or ""] + list(anchors))
+
+
+def get_vectorizer():
+    """返回特征哈希向量化器；sklearn 和 scipy 导入较慢，第一次使用时才导入"""
+    global _vectorizer
+    if _vectorizer is None:
+        from sklearn.feature_extraction.text import HashingVectorizer
+        # 与 TfidfVectorizer 默认相同的分词方式；不做归一化，IDF 加权后再归一化
+        _vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+    return _vectorizer
+
+
+def vectors_path(index):
+    return os.path.join(vectors_dir, index)
+
+
+class DocVectorWriter:
+    """建索引时逐条收集文档文本，结束后统一计算 IDF 并保存"""
+
+    def __init__(self):
+        self._ids = []
+        self._texts = []
+        self._batches = []  # 已向量化的词频矩阵（未加权）
+
+    def add(self, doc_id, source):
+        self._ids.append(doc_id)
+        self._texts.append(doc_text(source))
+        if len(self._texts) >= batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._texts:
+            self._batches.append(get_vectorizer().transform(self._texts).tocsr())
+            self._texts = []
+
+    def save(self, path):
+        """计算 IDF、加权归一化后按文档 id 排序保存到 path，返回保存的文档数"""
+        from scipy.sparse import vstack
+        from sklearn.preprocessing import normalize
+
+        self._flush()
+        if not self._batches:
+            return 0
+        tf = vstack(self._batches).tocsr()
+        num_docs = tf.shape[0]
+        # 与 TfidfVectorizer(smooth_idf=True) 相同的 IDF 公式
+        df = np.bincount(tf.indices, minlength=n_features)
+        idf = np.log((1 + num_docs) / (1 + df)) + 1
+        matrix = normalize(tf.multiply(idf).tocsr())
+
+        ids = np.array(self._ids, dtype="S40")
+        order = np.argsort(ids, kind="stable")
+        matrix = matrix[order]
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "ids.npy"), ids[order])
+        np.save(os.path.join(path, "indptr.npy"), matrix.indptr.astype(np.int64))
+        np.save(os.path.join(path, "indices.npy"), matrix.indices.astype(np.int32))
+        np.save(os.path.join(path, "data.npy"), matrix.data.astype(np.float32))
+        np.save(os.path.join(path, "idf.npy"), idf.astype(np.float32))
+        return num_docs
+
+
+class StaleIds:
+    """增量更新时收集改写的文档 id（与 DocVectorWriter 相同的 add 接口），结束后交给 mark_stale"""
+
+    def __init__(self):
+        self.ids = []
+
+    def add(self, doc_id, source):
+        self.ids.append(doc_id)
+
+
+class DocVectors:
+    """以内存映射方式打开的文档向量，按文档 id 查找"""
+
+    def __init__(self, path):
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.ids = load("ids.npy")
+        self.indptr = load("indptr.npy")
+        self.indices = load("indices.npy")
+        self.data = load("data.npy")
+        self.idf = np.asarray(load("idf.npy"))
+        self.stale_file = os.path.join(path, "stale.npy")
+        self.stale = np.array([], dtype="S40")  # 已过期（增量更新改写过）的文档 id，已排序
+        self._stale_stat = None  # 上次检查时 stale.npy 的 (inode, 修改时间)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _check_stale(self):
+        """stale.npy 变化时重新加载（增量更新可能由其它进程执行）"""
+        try:
+            stat = os.stat(self.stale_file)
+            current = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            current = None
+        if current != self._stale_stat:
+            self.stale = np.load(self.stale_file) if current else np.array([], dtype="S40")
+            self._stale_stat = current
+        return self.stale
+
+    def transform(self, texts):
+        """用与文档相同的词表和 IDF 对文本做向量化（L2 归一化）"""
+        from sklearn.preprocessing import normalize
+
+        matrix = get_vectorizer().transform(texts).tocsr()
+        matrix.data *= self.idf[matrix.indices]
+        return normalize(matrix, copy=False)
+
+    def lookup(self, doc_ids, sources):
+        """返回与 doc_ids 一一对应的向量矩阵，旁路文件中没有的文档按 sources 现场计算"""
+        from scipy.sparse import csr_matrix
+
+        keys = np.array(doc_ids, dtype="S40")
+        positions = np.searchsorted(self.ids, keys)
+        found = (positions < len(self.ids)) & (self.ids[np.minimum(positions, len(self.ids) - 1)] == keys)
+        stale = self._check_stale()
+        if len(stale):
+            found &= ~np.isin(keys, stale)
+
+        missing = np.flatnonzero(~found)
+        computed = self.transform([doc_text(sources[i]) for i in missing]) if len(missing) else None
+
+        # 找到的行直接从内存映射的 CSR 中切片，没找到的行取现场计算的结果，再拼接为一个矩阵
+        data, indices = [], []
+        for i, position in enumerate(positions):
+            if found[i]:
+                start, end = self.indptr[position], self.indptr[position + 1]
+                data.append(self.data[start:end])
+                indices.append(self.indices[start:end])
+            else:
+                row = computed[np.searchsorted(missing, i)]
+                data.append(row.data.astype(np.float32))
+                indices.append(row.indices.astype(np.int32))
+        indptr = np.concatenate([[0], np.cumsum([len(row) for row in data])])
+        return csr_matrix((np.concatenate(data), np.concatenate(indices), indptr),
+                          shape=(len(keys), n_features))
+
+
+def cosine(left, right):
+    """两组已归一化向量两两之间的余弦相似度，返回 (len(left), len(right)) 的稠密数组
+
+    只在两边实际出现的哈希特征上展开为稠密矩阵，避免在 n_features 维上做稀疏转置。
+    """
+    from scipy.sparse import csr_matrix
+
+    columns = np.union1d(left.indices, right.indices)
+    dense = []
+    for matrix in (left, right):
+        compact = csr_matrix((matrix.data, np.searchsorted(columns, matrix.indices), matrix.indptr),
+                             shape=(matrix.shape[0], len(columns)))
+        dense.append(compact.toarray())
+    return dense[0] @ dense[1].T
+
+
+def save_vectors(writer, index):
+    """把 writer 中的向量保存为 index 的旁路文件"""
+    count = writer.save(vectors_path(index))
+    print(f"Saved {count} document vectors to {vectors_path(index)}")
+    return count
+
+
+def delete_vectors(index):
+    """删除 index 的旁路文件（不存在时忽略）"""
+    shutil.rmtree(vectors_path(index), ignore_errors=True)
+    with _stores_lock:
+        _stores.pop(index, None)
+
+
+def mark_stale(index, doc_ids):
+    """把 doc_ids 记为 index 旁路文件中已过期的文档，返回过期文档总数；index 没有旁路文件时忽略
+
+    与已有的过期 id 合并后原子地改写 stale.npy，检索进程在下一次查找时重新加载。
+    """
+    path = vectors_path(index)
+    if not doc_ids or not os.path.exists(os.path.join(path, "idf.npy")):
+        return 0
+    stale_file = os.path.join(path, "stale.npy")
+    stale = np.array(doc_ids, dtype="S40")
+    if os.path.exists(stale_file):
+        stale = np.concatenate([np.load(stale_file), stale])
+    stale = np.unique(stale)
+    tmp_file = os.path.join(path, "stale.tmp.npy")
+    np.save(tmp_file, stale)
+    os.replace(tmp_file, stale_file)
+    return len(stale)
+
+
+def get_store(index):
+    """返回 index 的 DocVectors，没有旁路文件时返回 None；结果按索引名缓存"""
+    with _stores_lock:
+        if index in _stores:
+            return _stores[index]
+    path = vectors_path(index)
+    store = DocVectors(path) if os.path.exists(os.path.join(path, "idf.npy")) else None
+    with _stores_lock:
+        _stores[index] = store
+    return store
@@ -1,101 +1,352 @@
-from elasticsearch import Elasticsearch
-import ast
-import re
+from elasticsearch import Elasticsearch, ApiError, TransportError
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import time
+
+import doc_vectors
+import metrics
+import suggest
+from dedup import iter_deduplicated
+from query_cache import mark_index_changed
+from records import make_doc
 
 # 创建 Elasticsearch 客户端连接，指定 scheme 为 http
 es = Elasticsearch([{'host': 'localhost', 'port': 9200, 'scheme': 'http'}])
 
+# web.py 查询的是这个别名；每次重建都写入新的版本索引 nankai_url_final_v<时间戳>，完成后再切换别名
 index_name = 'nankai_url_final'
+keep_versions = 3  # 除当前版本外最多保留的旧版本数，用于回滚
+warmup_queries = ["南开大学", "通知", "招生", "图书馆", "计算机学院"]  # 切换别名前用于预热的查询
+
+# 批量导入参数
+bulk_chunk_size = 500  # 每个 _bulk 请求包含的文档数
+bulk_workers = 4  # 并行发送 _bulk 请求的线程数
+bulk_max_retries = 5  # 被拒绝的文档最多重试次数
+bulk_backoff = 0.5  # 第一次重试前等待的秒数，之后每次翻倍
+RETRYABLE_STATUS = {429, 502, 503, 504}
+max_failed_ratio = 0.0  # 重建时写入失败的文档比例超过该值即放弃新版本，不切换别名
 
-# 检查索引是否存在
-if es.indices.exists(index=index_name):
-    # 如果索引存在，删除旧的索引
-    es.indices.delete(index=index_name)
-    print(f"Deleted existing index: {index_name}")
+title_prefix_max_chars = 20  # title.prefix 保存的最长前缀（字符数），web.py 改写前缀查询时使用
 
 # 定义新的索引映射（根据需要调整映射）
 index_mapping = {
+    "settings": {
+        "analysis": {
+            "char_filter": {
+                # 与 web.build_wildcard_query 和 local_search.normalize_title 一样合并连续的空白
+                "collapse_whitespace": {"type": "pattern_replace", "pattern": "\\s+", "replacement": " "}
+            },
+            "filter": {
+                "title_edge_ngram": {"type": "edge_ngram", "min_gram": 1, "max_gram": title_prefix_max_chars}
+            },
+            "analyzer": {
+                # 整个标题作为一个词项，小写后展开为所有前缀，前缀查询变为一次词项查找
+                "title_prefix": {"type": "custom", "tokenizer": "keyword", "char_filter": ["collapse_whitespace"],
+                                 "filter": ["trim", "lowercase", "title_edge_ngram"]},
+                "title_prefix_search": {"type": "custom", "tokenizer": "keyword", "char_filter": ["collapse_whitespace"],
+                                        "filter": ["trim", "lowercase"]}
+            }
+        }
+    },
     "mappings": {
         "properties": {
             "url": {"type": "text"},
-            "title": {"type": "text"},
-            "anchor_text": {"type": "keyword"},
+            "title": {
+                "type": "text",
+                "fields": {
+                    # 通配符查询用：wildcard 类型按 n-gram 建索引，前导 / 中间的 * 不需要扫描词典，
+                    # 并且匹配整个标题，模式可以跨越分词边界
+                    "wild": {"type": "wildcard"},
+                    # 前缀查询用：查询时按整个前缀查找，不再展开
+                    "prefix": {"type": "text", "analyzer": "title_prefix", "search_analyzer": "title_prefix_search",
+                               "norms": False, "index_options": "docs"}
+                }
+            },
+            # 按词检索并计算 BM25（与 local_search 相同），keyword 子字段保留整段锚文本用于精确匹配
+            "anchor_text": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
             "description": {"type": "text"},
-            "pagerank": {"type": "float"}
+            "pagerank": {"type": "float"},
+            "doc_id": {"type": "keyword"}  # 与文档 _id 相同，检索结果按 (得分, doc_id) 稳定排序以便翻页
         }
     }
 }
 
-# 创建新的索引
-es.indices.create(index=index_name, body=index_mapping)
-print(f"Created new index: {index_name}")
-
-def load_and_deduplicate(file_path):
-    """加载并去重数据"""
-    data = []
-    unique_urls = set()
-    unique_titles = set()  # 用来存储已见过的标题
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            # 修复多余的转义字符和错误的引号
-            line = line.strip()
-
-            # 移除多余的反斜杠，防止反斜杠对双引号的干扰
-            line = re.sub(r'\\+', '', line)  # 移除所有反斜杠
-
-            # 替换 np.float64(...) 为普通的浮点数格式
-            line = re.sub(r'np\.float64\((.*?)\)', r'\1', line)
-
-            # 修复标题中的未转义的双引号
-            line = re.sub(r'"title":\s*"([^"]*)"', lambda m: '"title": "' + m.group(1).replace('"', '\\"') + '"', line)
-
-            # 处理标题中的双引号，确保它们被转义
-            line = line.replace('"It\'s', r'\"It\'s').replace('world."', 'world.\"')
-
-            try:
-                # 将格式化后的字符串转换为字典
-                record = ast.literal_eval(line)  # 使用 literal_eval 安全地解析为字典
-
-                url = record.get('url')
-                title = record.get('title')
-
-                if url and url not in unique_urls:
-                    # 只有标题未出现过，才会添加
-                    if title not in unique_titles:
-                        unique_urls.add(url)
-                        unique_titles.add(title)
-                        data.append(record)
-            except (ValueError, SyntaxError) as e:
-                print(f"Failed to parse line: {line}\nError: {e}")
-
-    return data
-
-
-def index_data_to_elasticsearch(file_path):
-    data = load_and_deduplicate(file_path)
-    count = 0
-    for record in data:
-        # 限制锚文本数量为最多 5 个
-        anchor_texts = record.get('anchor_text', [])[:5]
-
-        doc = {
-            "url": record.get('url', ''),
-            "title": record.get('title', 'No Title'),
-            "anchor_text": anchor_texts,
-            "description": record.get('description', ''),
-            "pagerank": record.get('page_rank', 0.0)
-        }
-        count += 1
+
+def create_index():
+    """按映射创建一个新的版本索引并返回其名称，不影响别名当前指向的索引"""
+    version_index = f"{index_name}_v{int(time.time() * 1000)}"
+    es.indices.create(index=version_index, body=index_mapping)
+    print(f"Created new index: {version_index}")
+    return version_index
+
+
+def list_versions():
+    """返回所有版本索引的名称，按从旧到新排序"""
+    return sorted(es.indices.get(index=f"{index_name}_v*").keys())
+
+
+def current_version():
+    """返回别名当前指向的版本索引，没有别名时返回 None"""
+    if not es.indices.exists_alias(name=index_name):
+        return None
+    return next(iter(es.indices.get_alias(name=index_name).keys()))
+
+
+def warm_index(version_index):
+    """刷新并合并段，再执行几次常见查询，让新索引在切换前完成预热"""
+    es.indices.refresh(index=version_index)
+    es.indices.forcemerge(index=version_index, max_num_segments=1)
+    for query in warmup_queries:
+        es.search(index=version_index, body={"query": {"multi_match": {
+            "query": query, "fields": ["title^3", "description^2", "anchor_text^2", "url^1"]}}})
+
+
+def swap_alias(version_index):
+    """原子地把别名切换到 version_index
+
+    旧版本中直接以别名命名的索引会在同一个请求中删除，之后别名即可使用该名称。
+    """
+    actions = [{"add": {"index": version_index, "alias": index_name}}]
+    previous = current_version()
+    if previous is not None:
+        actions.insert(0, {"remove": {"index": previous, "alias": index_name}})
+    elif es.indices.exists(index=index_name):
+        actions.insert(0, {"remove_index": {"index": index_name}})
+    es.indices.update_aliases(actions=actions)
+    mark_index_changed(version_index)
+    print(f"Alias {index_name} now points to {version_index} (was {previous})")
+
+
+def prune_versions():
+    """删除超出 keep_versions 的旧版本索引（别名当前指向的版本不会被删除）"""
+    current = current_version()
+    old_versions = [name for name in list_versions() if name != current]
+    for name in old_versions[:max(len(old_versions) - keep_versions, 0)]:
+        es.indices.delete(index=name)
+        doc_vectors.delete_vectors(name)
+        suggest.delete_phrases(name)
+        print(f"Deleted old index: {name}")
+
+
+def rollback():
+    """把别名切换回当前版本之前的一个版本"""
+    current = current_version()
+    older = [name for name in list_versions() if current is None or name < current]
+    if not older:
+        raise RuntimeError(f"No older version of {index_name} to roll back to")
+    swap_alias(older[-1])
+    return older[-1]
+
+
+def rebuild_index(file_path, chunk_size=None, workers=None):
+    """把爬取结果导入一个新的版本索引，预热后切换别名
+
+    导入失败、没有任何文档写入或失败的文档比例超过 max_failed_ratio 时删除新索引，
+    别名仍指向原来的版本，线上检索不受影响。
+    同时为新版本保存预先计算的文档向量（见 doc_vectors.py），供检索时重排序使用，
+    以及标题和锚文本的补全候选（见 suggest.py）。
+    """
+    version_index = create_index()
+    try:
+        writer = doc_vectors.DocVectorWriter()
+        phrases = suggest.PhraseWriter()
+        indexed, failed = index_data_to_elasticsearch(file_path, chunk_size, workers, index=version_index,
+                                                      vectors=[writer, phrases], tune_for_bulk=True)
+        if indexed == 0:
+            raise RuntimeError(f"No documents were indexed into {version_index}")
+        if failed > max_failed_ratio * (indexed + failed):
+            raise RuntimeError(f"{failed} of {indexed + failed} documents failed to index into {version_index}")
+        doc_vectors.save_vectors(writer, version_index)
+        suggest.save_phrases(phrases, version_index)
+        warm_index(version_index)
+    except BaseException:
+        es.indices.delete(index=version_index)
+        doc_vectors.delete_vectors(version_index)
+        suggest.delete_phrases(version_index)
+        print(f"Build failed, deleted {version_index}; {index_name} was left unchanged")
+        raise
+    swap_alias(version_index)
+    prune_versions()
+    return version_index
+
+
+def collect_vectors(docs, writers):
+    """在文档流经索引流程时把它们加入各个 writer"""
+    for doc in docs:
+        for writer in writers:
+            writer.add(doc['doc_id'], doc)
+        yield doc
+
+
+def chunked(iterable, size):
+    """把可迭代对象切分为长度为 size 的列表"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def send_bulk_chunk(docs, index):
+    """用一次 _bulk 请求把一批文档写入 index，被拒绝（429/503）的文档按指数退避重试
+
+    返回 (成功数, 失败数, 重试次数)。
+    """
+    pending = docs
+    failed = 0
+    retries = 0
+    for attempt in range(bulk_max_retries + 1):
+        if attempt:
+            retries += 1
+            time.sleep(bulk_backoff * 2 ** (attempt - 1))
+
+        operations = []
+        for doc in pending:
+            operations.append({"index": {"_index": index, "_id": doc['doc_id']}})
+            operations.append(doc)
         try:
-            es.index(index=index_name, document=doc)
-            print(f"Indexed: {count}{doc['url']}")
-        except Exception as e:
-            print(f"Failed to index {doc['url']}: {e}")
+            with metrics.timer("index_stage", stage="bulk_request"):
+                response = es.bulk(operations=operations)
+        except (ApiError, TransportError) as e:
+            # 连接错误没有状态码，与 429/5xx 一样重试
+            status = getattr(e, "status_code", None)
+            metrics.inc("index_bulk_errors_total", status=status or "connection")
+            if status is not None and status not in RETRYABLE_STATUS:
+                print(f"Bulk request failed: {e}")
+                return len(docs) - failed - len(pending), failed + len(pending), retries
+            continue
+
+        if not response.get("errors"):
+            return len(docs) - failed, failed, retries
+
+        # 只重试被拒绝的文档，其余错误（如映射错误）直接记为失败
+        retry_docs = []
+        for doc, item in zip(pending, response["items"]):
+            result = item.get("index", {})
+            status = result.get("status", 200)
+            if status in RETRYABLE_STATUS:
+                retry_docs.append(doc)
+            elif status >= 300:
+                failed += 1
+                print(f"Failed to index {doc['url']}: {result.get('error')}")
+        pending = retry_docs
+        if not pending:
+            return len(docs) - failed, failed, retries
+
+    print(f"Giving up on {len(pending)} documents after {bulk_max_retries} retries")
+    return len(docs) - failed - len(pending), failed + len(pending), retries
+
+
+def tune_index_for_bulk(index):
+    """导入期间关闭刷新并去掉副本，返回原来的设置用于恢复"""
+    settings = es.indices.get_settings(index=index)
+    current = next(iter(settings.values()))["settings"].get("index", {})
+    previous = {key: current.get(key) for key in ("refresh_interval", "number_of_replicas")}
+    es.indices.put_settings(index=index, settings={"index": {"refresh_interval": "-1",
+                                                             "number_of_replicas": 0}})
+    return previous
+
+
+def restore_index_settings(index, previous):
+    """恢复导入前的设置（原来没有显式设置的项恢复为默认值）并刷新索引"""
+    es.indices.put_settings(index=index, settings={"index": previous})
+    es.indices.refresh(index=index)
+
+
+def index_data_to_elasticsearch(file_path, chunk_size=None, workers=None, index=None, vectors=None,
+                                tune_for_bulk=False):
+    """使用 _bulk 批量、并行地把爬取结果写入索引，结束后输出吞吐量统计
+
+    index 默认为别名 index_name（增量更新时直接写入当前版本）。
+    vectors 为 doc_vectors.DocVectorWriter（或多个有 add(doc_id, source) 方法的对象组成的列表，
+    如 suggest.PhraseWriter）时同时把每篇文档交给它们。
+    tune_for_bulk 为 True 时导入期间关闭刷新并去掉副本，只用于尚未上线的新版本索引：
+    线上索引恢复副本需要完整地重新复制分片，增量更新的少量文档不值得这样做。
+    """
+    chunk_size = chunk_size or bulk_chunk_size
+    workers = workers or bulk_workers
+    index = index or index_name
+    start_time = time.time()
+    if not es.indices.exists(index=index):
+        raise RuntimeError(f"Index {index} does not exist, build it first with rebuild_index")
+
+    previous = tune_index_for_bulk(index) if tune_for_bulk else None
+    writers = list(vectors) if isinstance(vectors, list) else [vectors] if vectors is not None else []
+    stale = None
+    if index == index_name:
+        # 直接更新线上版本：改写的文档在旁路文件中的向量已过期
+        stale = doc_vectors.StaleIds()
+        writers.append(stale)
+    indexed = failed = retries = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = set()
+            records = iter_deduplicated(file_path)
+            docs = (make_doc(record) for record in records)
+            if writers:
+                docs = collect_vectors(docs, writers)
+            for chunk in chunked(docs, chunk_size):
+                # 限制同时在途的批次数量，避免把所有文档都堆在内存中
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        ok, bad, retried = future.result()
+                        indexed, failed, retries = indexed + ok, failed + bad, retries + retried
+                in_flight.add(executor.submit(send_bulk_chunk, chunk, index))
+            for future in in_flight:
+                ok, bad, retried = future.result()
+                indexed, failed, retries = indexed + ok, failed + bad, retries + retried
+    finally:
+        if previous is not None:
+            restore_index_settings(index, previous)
+        else:
+            es.indices.refresh(index=index)
+    if index == index_name:
+        # 直接更新了线上版本，改写的文档改为现场计算向量，并让检索结果缓存失效
+        version = current_version() or index
+        doc_vectors.mark_stale(version, stale.ids)
+        mark_index_changed(version)
+
+    elapsed = time.time() - start_time
+    docs_per_second = indexed / elapsed if elapsed > 0 else 0.0
+    metrics.inc("index_docs_total", indexed)
+    metrics.inc("index_failures_total", failed)
+    metrics.inc("index_retries_total", retries)
+    metrics.set_gauge("index_docs_per_second", round(docs_per_second, 1))
+    print(f"Indexed {indexed} documents into {index} in {elapsed:.2f} seconds "
+          f"({docs_per_second:.1f} docs/s, {failed} failed, {retries} retried chunks, "
+          f"chunk_size={chunk_size}, workers={workers})")
+    return indexed, failed
+
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="将爬取结果索引到 Elasticsearch")
+    parser.add_argument("file", nargs="?", default="urls_with_data.jsonl", help="爬取结果文件")
+    parser.add_argument("--incremental", action="store_true", help="只更新文件中的文档，不重建索引")
+    parser.add_argument("--rollback", action="store_true", help="把别名切换回上一个版本")
+    parser.add_argument("--chunk-size", type=int, default=bulk_chunk_size, help="每个 _bulk 请求的文档数")
+    parser.add_argument("--workers", type=int, default=bulk_workers, help="并行发送 _bulk 请求的线程数")
+    parser.add_argument("--max-failed-ratio", type=float, default=max_failed_ratio,
+                        help="重建时允许写入失败的文档比例，超过时不切换别名")
+    parser.add_argument("--from-store", action="store_true",
+                        help="先从爬虫的原始网页存档重新解析记录（写入 file），不重新爬取")
+    args = parser.parse_args()
+    max_failed_ratio = args.max_failed_ratio
 
-# 文件路径
-txt_file = 'urls_with_data.txt'
+    if args.from_store:
+        import catch_url
+        catch_url.reextract(args.file)
 
-# 将数据索引到 Elasticsearch
-index_data_to_elasticsearch(txt_file)
+    if args.rollback:
+        rollback()
+    elif args.incremental:
+        # 直接更新别名指向的当前版本
+        index_data_to_elasticsearch(args.file, args.chunk_size, args.workers)
+        metrics.write_summary("index", {"mode": "incremental", "file": args.file})
+    else:
+        # 构建新版本并切换别名
+        rebuild_index(args.file, args.chunk_size, args.workers)
+        metrics.write_summary("index", {"mode": "rebuild", "file": args.file})
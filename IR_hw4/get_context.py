@@ -4,6 +4,8 @@ from urllib.parse import urlparse, urljoin, urlunparse
 import time
 import os
 
+from records import dumps_record
+
 
 def extract_links(html, base_url):
     """从网页中提取所有链接"""
@@ -88,7 +90,7 @@ def process_urls_from_file(input_file):
                     data["page_rank"] = float(pagerank)
                     url_data[url] = data
                 current_index += 1  # 更新当前URL的编号
-            save_results_to_file(url_data, 'urls_data.json')  # 每处理100行就保存一次
+            save_results_to_file(url_data, 'urls_data.jsonl')  # 每处理100行就保存一次
             url_data.clear()  # 清空已保存的数据
             time.sleep(1)  # 给服务器一个小的延时，避免过快请求
 
@@ -96,21 +98,15 @@ def process_urls_from_file(input_file):
 
 
 def save_results_to_file(url_data, output_file):
-    """将提取的数据保存为格式化的JSON-like格式"""
+    """将提取的数据追加保存为 JSONL 格式（每行一条记录，格式见 records.py）"""
     with open(output_file, 'a', encoding='utf-8') as file:
         for url, data in url_data.items():
-            file.write(f"{url}: {{\n")
-            file.write(f'    "url": "{data["url"]}",\n')
-            file.write(f'    "anchor_text": {data["anchor_text"]},\n')
-            file.write(f'    "title": "{data["title"]}",\n')
-            file.write(f'    "description": "{data["description"]}",\n')
-            file.write(f'    "page_rank": {data["page_rank"]}\n')
-            file.write("},\n")
+            file.write(dumps_record(data))
 
 
 # 使用示例
 input_file = 'urls_with_pagerank.txt'
-output_file = 'urls_data.json'
+output_file = 'urls_data.jsonl'
 
 # 清空输出文件，避免数据追加时混乱
 with open(output_file, 'w', encoding='utf-8') as file:
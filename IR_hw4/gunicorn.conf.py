@@ -0,0 +1,18 @@
+"""gunicorn 配置：SECRET_KEY=... gunicorn -c gunicorn.conf.py wsgi:app
+
+默认使用多个进程，每个进程多个线程。各进程共享的状态都保存在磁盘上：
+查询历史读取 SQLite，检索结果缓存通过版本标记文件失效，截图任务状态写入任务文件，
+所以同一用户的请求可以落到任意进程。截图的浏览器会话在每个进程第一次截图时才启动，
+每个进程最多 SNAPSHOT_POOL_SIZE 个。
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_WORKERS", min(8, multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.environ.get("WEB_THREADS", 8))
+timeout = 30
+keepalive = 5
+# 不预加载：每个进程在 fork 之后自行创建 Elasticsearch 连接池、SQLite 连接和后台线程
+preload_app = False
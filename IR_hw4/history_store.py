@@ -0,0 +1,183 @@
+"""用户账户与查询历史的存储
+
+账户和历史记录保存在 SQLite（WAL 模式）中。新的查询先追加到内存中的待写入缓冲区，
+由后台线程按批写入数据库，进程退出时写入剩余部分；写入失败的批次放回缓冲区，下一次重试。
+读取最近的查询时按 (username, id) 索引从数据库读取最后几行，再合并本进程还没写入的查询，
+因此多个 Web 进程看到的是同一份历史（其它进程的新查询最多延迟 flush_interval 秒可见）。
+
+第一次打开空数据库时会导入旧版的 users.json 和 history/<用户名>.txt。
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+db_file = "search.db"
+flush_interval = 1.0  # 后台线程写入数据库的间隔（秒）
+flush_batch_size = 256  # 待写入的查询达到该数量时立即写入
+max_pending = 100000  # 数据库持续写入失败时缓冲区最多保留的查询数，超出后丢弃最早的
+
+# 旧版的存储位置，只用于导入
+legacy_users_file = "users.json"
+legacy_history_dir = "history"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    query TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_user ON history (username, id);
+"""
+
+
+class HistoryStore:
+    """账户和查询历史，写入按批刷入 SQLite，读取时合并还没写入的部分"""
+
+    def __init__(self, path=None, start_flusher=True):
+        self.path = path or db_file
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL 模式下在检查点时同步，提交时不 fsync
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()  # 保护数据库连接
+        self._lock = threading.Lock()  # 保护待写入缓冲区
+        self._pending = []  # 尚未写入数据库的 (用户名, 查询, 时间)
+        self._flushing = []  # 正在写入数据库的批次，提交前读取历史时仍要包含
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.migrate_legacy()
+        self._flusher = None
+        if start_flusher:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    # 账户
+
+    def get_password(self, username):
+        with self._db_lock:
+            row = self._conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, password):
+        """添加用户，用户名已存在时返回 False"""
+        with self._db_lock:
+            try:
+                with self._conn:
+                    self._conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    # 查询历史
+
+    def append(self, username, query):
+        """追加一条查询，O(1)，不访问磁盘"""
+        with self._lock:
+            self._pending.append((username, query, time.time()))
+            if len(self._pending) >= flush_batch_size:
+                self._wakeup.set()
+
+    def recent(self, username, limit=5):
+        """返回最近的 limit 条查询，从旧到新排列
+
+        先取本进程还没写入的查询，再按索引读取数据库中的最后 limit 行；
+        读取期间刚好提交的批次会同时出现在两边，按 (查询, 时间) 去掉重复。
+        """
+        if not limit:
+            return []
+        with self._lock:
+            local = [(query, created) for user, query, created in self._flushing + self._pending
+                     if user == username]
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT query, created FROM history WHERE username = ? ORDER BY id DESC LIMIT ?",
+                (username, limit)).fetchall()
+        stored = set(rows)
+        merged = list(reversed(rows)) + [item for item in local if item not in stored]
+        merged.sort(key=lambda item: item[1])  # 稳定排序，时间相同时保持写入顺序
+        return [query for query, _ in merged[-limit:]]
+
+    def query_users(self, limit=200000):
+        """所有用户的查询，返回不重复的 [(查询, 用户名)]（只包含已写入数据库的部分）"""
+        with self._db_lock:
+            return self._conn.execute("SELECT DISTINCT query, username FROM history LIMIT ?", (limit,)).fetchall()
+
+    def flush(self):
+        """把缓冲区中的查询在一个事务中写入数据库；失败时放回缓冲区并抛出 sqlite3.Error"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._flushing = pending
+        if not pending:
+            return 0
+        try:
+            with self._db_lock:
+                with self._conn:
+                    self._conn.executemany("INSERT INTO history (username, query, created) VALUES (?, ?, ?)",
+                                           pending)
+        except sqlite3.Error:
+            with self._lock:
+                self._pending = pending + self._pending
+                self._flushing = []
+                dropped = len(self._pending) - max_pending
+                if dropped > 0:
+                    del self._pending[:dropped]
+                    print(f"Dropped {dropped} search history entries that could not be written")
+            raise
+        with self._lock:
+            self._flushing = []
+        return len(pending)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Failed to flush search history: {e}")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            print(f"Failed to flush search history: {e}")
+        with self._db_lock:
+            self._conn.close()
+
+    # 导入旧数据
+
+    def migrate_legacy(self):
+        """数据库为空时导入旧版的 users.json 和 history/*.txt"""
+        with self._db_lock:
+            has_users = self._conn.execute("SELECT 1 FROM users LIMIT 1").fetchone()
+            has_history = self._conn.execute("SELECT 1 FROM history LIMIT 1").fetchone()
+            with self._conn:
+                if not has_users and os.path.exists(legacy_users_file):
+                    with open(legacy_users_file, 'r') as f:
+                        users = json.load(f)
+                    self._conn.executemany("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)",
+                                           users.items())
+                if not has_history and os.path.isdir(legacy_history_dir):
+                    now = time.time()
+                    for name in sorted(os.listdir(legacy_history_dir)):
+                        if not name.endswith('.txt'):
+                            continue
+                        with open(os.path.join(legacy_history_dir, name), 'r', encoding='utf-8') as f:
+                            queries = [line.rstrip('\n') for line in f if line.strip()]
+                        self._conn.executemany("INSERT INTO history (username, query, created) VALUES (?, ?, ?)",
+                                               [(name[:-4], query, now) for query in queries])
@@ -0,0 +1,122 @@
+"""以整数 id 保存的紧凑链接图
+
+爬虫在抓取过程中把 URL 转换为整数 id，边追加到 array 缓冲区中，
+结束后保存为 CSR 格式（indptr.npy / indices.npy），可以直接内存映射加载，
+PageRank 等后续分析不需要再构造 Python 对象。
+"""
+from array import array
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class LinkGraph:
+    """URL 链接图：节点为整数 id，边保存在数组中"""
+
+    def __init__(self):
+        self.url_ids = {}  # URL -> id
+        self._urls = []  # id -> URL
+        self._src = array('i')  # 边的起点 id
+        self._dst = array('i')  # 边的终点 id
+        self._crawled = bytearray()  # 节点是否已被抓取（出链已记录）
+        self._csr = None  # 从文件加载的 (indptr, indices)，加载后的图是只读的
+        self._url_file = None
+
+    def intern(self, url):
+        """返回 URL 的整数 id，第一次出现时分配新的 id"""
+        node_id = self.url_ids.get(url)
+        if node_id is None:
+            node_id = len(self._urls)
+            self.url_ids[url] = node_id
+            self._urls.append(url)
+            self._crawled.append(0)
+        return node_id
+
+    def add_links(self, url, links):
+        """记录一个已抓取页面的全部出链"""
+        if self._csr is not None:
+            raise ValueError("LinkGraph loaded from disk is read-only")
+        src = self.intern(url)
+        self._crawled[src] = 1
+        for link in links:
+            self._src.append(src)
+            self._dst.append(self.intern(link))
+
+    @property
+    def urls(self):
+        """id -> URL 列表，从文件加载的图在第一次访问时才读取 URL"""
+        if self._url_file is not None:
+            with open(self._url_file, "r", encoding="utf-8") as f:
+                self._urls = f.read().split("\n")[:-1]
+            self.url_ids = {url: i for i, url in enumerate(self._urls)}
+            self._url_file = None
+        return self._urls
+
+    @property
+    def crawled(self):
+        """已抓取节点的布尔数组"""
+        return np.frombuffer(bytes(self._crawled), dtype=np.uint8).astype(bool)
+
+    def __len__(self):
+        return len(self._crawled)
+
+    def __contains__(self, url):
+        """URL 是否为已抓取的页面"""
+        self.urls  # 确保 URL 已加载
+        node_id = self.url_ids.get(url)
+        return node_id is not None and bool(self._crawled[node_id])
+
+    def to_csr(self):
+        """返回按起点排序的 CSR 结构 (indptr, indices)"""
+        if self._csr is not None:
+            return self._csr
+        src = np.frombuffer(self._src, dtype=np.int32)
+        dst = np.frombuffer(self._dst, dtype=np.int32)
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(self)), out=indptr[1:])
+        return indptr, dst[order]
+
+    def to_matrix(self):
+        """返回邻接矩阵 A（A[i, j] 为 i 指向 j 的链接数）"""
+        indptr, indices = self.to_csr()
+        n = len(self)
+        return csr_matrix((np.ones(len(indices)), indices, indptr), shape=(n, n))
+
+    def to_adj_list(self):
+        """转换为 {URL: [链接 URL, ...]} 形式的邻接表（只包含已抓取的页面）"""
+        indptr, indices = self.to_csr()
+        urls = self.urls
+        return {urls[i]: [urls[j] for j in indices[indptr[i]:indptr[i + 1]]]
+                for i in np.flatnonzero(self.crawled)}
+
+    @classmethod
+    def from_adj_list(cls, adj_list):
+        """由 {URL: [链接 URL, ...]} 形式的邻接表构造"""
+        graph = cls()
+        for url, links in adj_list.items():
+            graph.add_links(url, links)
+        return graph
+
+    def save(self, graph_dir):
+        """保存为 CSR 文件：indptr.npy / indices.npy / crawled.npy / urls.txt"""
+        os.makedirs(graph_dir, exist_ok=True)
+        indptr, indices = self.to_csr()
+        np.save(os.path.join(graph_dir, "indptr.npy"), indptr)
+        np.save(os.path.join(graph_dir, "indices.npy"), indices)
+        np.save(os.path.join(graph_dir, "crawled.npy"), self.crawled)
+        with open(os.path.join(graph_dir, "urls.txt"), "w", encoding="utf-8") as f:
+            for url in self.urls:
+                f.write(url + "\n")
+
+    @classmethod
+    def load(cls, graph_dir, mmap=True):
+        """加载 save 保存的图；mmap 为 True 时以内存映射方式打开数组"""
+        mode = "r" if mmap else None
+        graph = cls()
+        graph._csr = (np.load(os.path.join(graph_dir, "indptr.npy"), mmap_mode=mode),
+                      np.load(os.path.join(graph_dir, "indices.npy"), mmap_mode=mode))
+        graph._crawled = bytearray(np.load(os.path.join(graph_dir, "crawled.npy")).astype(np.uint8))
+        graph._url_file = os.path.join(graph_dir, "urls.txt")
+        return graph
@@ -0,0 +1,462 @@
+"""进程内的 BM25 检索引擎，可以代替 Elasticsearch
+
+由爬取结果（records.py 格式，与 Elasticsearch 索引相同的去重 dedup.iter_deduplicated 和文档转换 records.make_doc）建立倒排索引：
+    <字段>.terms.txt   词项，按编号排列
+    <字段>.ptr.npy     每个词项在 docs.bin / tfs.bin 中的起止位置
+    <字段>.docs.bin    文档编号的差值，varint 压缩
+    <字段>.tfs.bin     词频，varint 压缩
+    <字段>.lengths.npy 每篇文档该字段的词数
+    titles.txt / titles.order.npy   小写的标题及其字典序，用于前缀查询和通配符查询的最终匹配
+    docs.jsonl / docs.offsets.npy   文档 _source，按文档编号排列
+    doc_ids.npy / pagerank.npy      文档 id 和 PageRank
+倒排表和文档都以内存映射方式读取。每次构建写入 index_dir 下的新版本目录，
+完成后原子地改写 CURRENT 指向新版本，检索进程在下一次查询时切换。
+
+LocalSearch 实现 web.py 用到的 Elasticsearch 接口：search(index, body) / msearch(searches)，
+支持 multi_match（best_fields）、match、wildcard、match_all、constant_score、
+function_score（field_value_factor）、size / from、按 (_score, doc_id) 排序和 search_after，返回与 Elasticsearch 相同结构的结果。
+分词方式与 Elasticsearch 的 standard 分词器相近：中日韩文字按单字切分，其它按字母数字连续串切分，统一小写。
+与 es_createInex 的映射对应，title.wild 对整个标题做通配符匹配（先用单字 / 相邻两字的倒排表筛选候选，
+再用正则表达式确认），title.prefix 对整个标题做前缀匹配（在排好序的标题上二分查找）。
+"""
+from bisect import bisect_left
+from collections import Counter
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import doc_vectors
+import suggest
+from dedup import iter_deduplicated
+from query_cache import mark_index_changed
+from records import make_doc
+
+index_dir = "local_index"
+keep_versions = 2  # 除当前版本外保留的旧版本数
+fields = ["title", "description", "anchor_text", "url"]
+wild_field = "title.wild"  # 标题的单字和相邻两字，用于通配符查询筛选候选文档
+k1 = 1.2  # BM25 参数，与 Elasticsearch 默认值相同
+b = 0.75
+
+TOKEN_RE = re.compile(r"[㐀-鿿豈-﫿]|[^\W㐀-鿿豈-﫿_]+")
+
+
+def tokenize(text):
+    if isinstance(text, list):
+        text = " ".join(str(item) for item in text)
+    return TOKEN_RE.findall(str(text or "").lower())
+
+
+def normalize_title(title):
+    """标题前缀 / 通配符匹配使用的形式：合并空白并转为小写"""
+    return " ".join(str(title or "").split()).lower()
+
+
+def title_ngrams(title):
+    title = normalize_title(title)
+    return sorted(set(title) | {title[i:i + 2] for i in range(len(title) - 1)})
+
+
+def literal_ngrams(literal):
+    """通配符模式中一段不含通配符的文字必须包含的 n-gram"""
+    if len(literal) <= 1:
+        return [literal] if literal else []
+    return [literal[i:i + 2] for i in range(len(literal) - 1)]
+
+
+def encode_varints(values):
+    """把非负整数数组编码为 varint 字节串（每字节 7 位，最高位表示后面还有字节）"""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b""
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+    starts = np.concatenate([[0], np.cumsum(nbytes)[:-1]])
+    out = np.zeros(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max())):
+        mask = nbytes > k
+        chunk = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = (chunk | more).astype(np.uint8)
+    return out.tobytes()
+
+
+def decode_varints(data):
+    """encode_varints 的逆运算，data 为 uint8 数组"""
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    data = np.asarray(data, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    shift = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    return np.add.reduceat((data & 0x7F) << (7 * shift), starts)
+
+
+def build_local_index(file_path, root=None):
+    """由爬取结果构建一个新的索引版本，切换 CURRENT 并返回版本名
+
+    没有读到任何文档时删除新版本并报错，CURRENT 仍指向原来的版本。
+    """
+    root = root or index_dir
+    version = f"local_v{int(time.time() * 1000)}"
+    path = os.path.join(root, version)
+    os.makedirs(path)
+    start_time = time.time()
+
+    analyzers = {field: (field, tokenize) for field in fields}  # 倒排表名 -> (文档字段, 分词函数)
+    analyzers[wild_field] = ("title", title_ngrams)
+    postings = {name: {} for name in analyzers}  # 倒排表名 -> 词项 -> ([文档编号], [词频])
+    lengths = {name: [] for name in analyzers}
+    doc_ids, pageranks, offsets, titles = [], [], [], []
+    writer = doc_vectors.DocVectorWriter()
+    phrases = suggest.PhraseWriter()
+    try:
+        with open(os.path.join(path, "docs.jsonl"), "wb") as docs_file:
+            for number, doc in enumerate(make_doc(record) for record in iter_deduplicated(file_path)):
+                offsets.append(docs_file.tell())
+                docs_file.write(json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n")
+                doc_ids.append(doc["doc_id"])
+                pageranks.append(doc.get("pagerank") or 0.0)
+                titles.append(normalize_title(doc.get("title")))
+                writer.add(doc["doc_id"], doc)
+                phrases.add(doc["doc_id"], doc)
+                for name, (field, analyze) in analyzers.items():
+                    tokens = analyze(doc.get(field))
+                    lengths[name].append(len(tokens))
+                    for term, tf in Counter(tokens).items():
+                        entry = postings[name].setdefault(term, ([], []))
+                        entry[0].append(number)
+                        entry[1].append(tf)
+            offsets.append(docs_file.tell())
+
+        meta = {"version": version, "num_docs": len(doc_ids), "avg_lengths": {}, "created": time.time()}
+        for field in analyzers:
+            terms = sorted(postings[field])
+            ptr = np.zeros((len(terms) + 1, 2), dtype=np.int64)
+            with open(os.path.join(path, f"{field}.docs.bin"), "wb") as docs_bin, \
+                    open(os.path.join(path, f"{field}.tfs.bin"), "wb") as tfs_bin:
+                for i, term in enumerate(terms):
+                    numbers, tfs = postings[field][term]
+                    docs_bin.write(encode_varints(np.diff(numbers, prepend=0)))
+                    tfs_bin.write(encode_varints(tfs))
+                    ptr[i + 1] = docs_bin.tell(), tfs_bin.tell()
+            with open(os.path.join(path, f"{field}.terms.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(terms))
+            np.save(os.path.join(path, f"{field}.ptr.npy"), ptr)
+            field_lengths = np.array(lengths[field], dtype=np.int32)
+            np.save(os.path.join(path, f"{field}.lengths.npy"), field_lengths)
+            meta["avg_lengths"][field] = float(field_lengths.mean()) if len(field_lengths) else 0.0
+        with open(os.path.join(path, "titles.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(titles))
+        np.save(os.path.join(path, "titles.order.npy"),
+                np.array(sorted(range(len(titles)), key=titles.__getitem__), dtype=np.int64))
+        np.save(os.path.join(path, "docs.offsets.npy"), np.array(offsets, dtype=np.int64))
+        np.save(os.path.join(path, "doc_ids.npy"), np.array(doc_ids, dtype="S40"))
+        np.save(os.path.join(path, "pagerank.npy"), np.array(pageranks, dtype=np.float64))
+        if not doc_ids:
+            # 与 es_createInex.rebuild_index 一样，不让空索引上线
+            raise RuntimeError(f"No documents were read from {file_path}")
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        doc_vectors.save_vectors(writer, version)
+        suggest.save_phrases(phrases, version)
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        doc_vectors.delete_vectors(version)
+        suggest.delete_phrases(version)
+        print(f"Build failed, deleted {version}; the current local index was left unchanged")
+        raise
+
+    # 原子地切换当前版本
+    with open(os.path.join(root, "CURRENT.tmp"), "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(os.path.join(root, "CURRENT.tmp"), os.path.join(root, "CURRENT"))
+    mark_index_changed(version)
+    prune_local_versions(root)
+    print(f"Built local index {version}: {len(doc_ids)} documents in {time.time() - start_time:.2f} seconds")
+    return version
+
+
+def prune_local_versions(root=None):
+    """删除超出 keep_versions 的旧版本（当前版本不会被删除）"""
+    root = root or index_dir
+    current = read_current(root)
+    old = sorted(name for name in os.listdir(root) if name.startswith("local_v") and name != current)
+    for name in old[:max(len(old) - keep_versions, 0)]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        doc_vectors.delete_vectors(name)
+        suggest.delete_phrases(name)
+
+
+def read_current(root):
+    try:
+        with open(os.path.join(root, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+class FieldIndex:
+    """一个字段的倒排表"""
+
+    def __init__(self, path, field, avg_length):
+        self.ptr = np.load(os.path.join(path, f"{field}.ptr.npy"))
+        self.docs = np.memmap(os.path.join(path, f"{field}.docs.bin"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(os.path.join(path, f"{field}.docs.bin")) else np.zeros(0, dtype=np.uint8)
+        self.tfs = np.memmap(os.path.join(path, f"{field}.tfs.bin"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(os.path.join(path, f"{field}.tfs.bin")) else np.zeros(0, dtype=np.uint8)
+        self.lengths = np.load(os.path.join(path, f"{field}.lengths.npy"), mmap_mode="r")
+        self.avg_length = avg_length or 1.0
+        with open(os.path.join(path, f"{field}.terms.txt"), "r", encoding="utf-8") as f:
+            self.terms = f.read().split("\n") if self.ptr.shape[0] > 1 else []
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+
+    def postings(self, term_id):
+        """返回 (文档编号数组, 词频数组)"""
+        (doc_start, tf_start), (doc_end, tf_end) = self.ptr[term_id], self.ptr[term_id + 1]
+        return np.cumsum(decode_varints(self.docs[doc_start:doc_end])), decode_varints(self.tfs[tf_start:tf_end])
+
+
+class LocalIndex:
+    """一个只读的索引版本"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.path = path
+        self.version = meta["version"]
+        self.num_docs = meta["num_docs"]
+        self.fields = {field: FieldIndex(path, field, meta["avg_lengths"][field]) for field in fields + [wild_field]}
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.numeric = {"pagerank": np.load(os.path.join(path, "pagerank.npy"), mmap_mode="r")}
+        self.offsets = np.load(os.path.join(path, "docs.offsets.npy"), mmap_mode="r")
+        self.sources = np.memmap(os.path.join(path, "docs.jsonl"), dtype=np.uint8, mode="r") \
+            if self.num_docs else np.zeros(0, dtype=np.uint8)
+        self._titles = None  # (标题列表, 字典序, 排好序的标题)，第一次前缀 / 通配符查询时加载
+
+    def title_table(self):
+        if self._titles is None:
+            with open(os.path.join(self.path, "titles.txt"), "r", encoding="utf-8") as f:
+                titles = f.read().split("\n")
+            order = np.load(os.path.join(self.path, "titles.order.npy"))
+            self._titles = titles, order, [titles[i] for i in order]
+        return self._titles
+
+    def source(self, number):
+        start, end = self.offsets[number], self.offsets[number + 1]
+        return json.loads(self.sources[start:end].tobytes())
+
+    def match(self, query, field_boosts):
+        """multi_match（best_fields）：每个字段分别计算 BM25，取加权后最高的字段得分"""
+        terms = Counter(tokenize(query))
+        best = np.zeros(self.num_docs)
+        for field, boost in field_boosts:
+            index = self.fields.get(field)
+            if index is None:
+                continue
+            scores = np.zeros(self.num_docs)
+            for term, query_tf in terms.items():
+                term_id = index.term_ids.get(term)
+                if term_id is None:
+                    continue
+                numbers, tfs = index.postings(term_id)
+                idf = math.log(1 + (self.num_docs - len(numbers) + 0.5) / (len(numbers) + 0.5))
+                norm = k1 * (1 - b + b * index.lengths[numbers] / index.avg_length)
+                scores[numbers] += query_tf * idf * tfs / (tfs + norm)
+            np.maximum(best, boost * scores, out=best)
+        return best, best > 0
+
+    def wildcard(self, field, pattern):
+        """wildcard：字段中有词项匹配通配符的文档得分为 1"""
+        index = self.fields.get(field)
+        scores = np.zeros(self.num_docs)
+        if index is None:
+            return scores, scores > 0
+        regex = wildcard_regex(pattern.lower())
+        for term_id, term in enumerate(index.terms):
+            if regex.fullmatch(term):
+                scores[index.postings(term_id)[0]] = 1.0
+        return scores, scores > 0
+
+    def title_wildcard(self, pattern):
+        """title.wild：整个标题匹配通配符；先按模式中文字片段的 n-gram 求交集得到候选，再逐个确认"""
+        pattern = normalize_title(pattern)
+        index = self.fields[wild_field]
+        candidates = None
+        for literal in re.split(r"[*?]+", pattern):
+            for gram in literal_ngrams(literal):
+                term_id = index.term_ids.get(gram)
+                if term_id is None:
+                    return np.zeros(self.num_docs), np.zeros(self.num_docs, dtype=bool)
+                numbers = index.postings(term_id)[0]
+                candidates = numbers if candidates is None else np.intersect1d(candidates, numbers,
+                                                                               assume_unique=True)
+        if candidates is None:
+            candidates = np.arange(self.num_docs)
+        regex = wildcard_regex(pattern)
+        titles = self.title_table()[0]
+        matched = np.zeros(self.num_docs, dtype=bool)
+        matched[[n for n in candidates if regex.fullmatch(titles[n])]] = True
+        return matched.astype(np.float64), matched
+
+    def title_prefix(self, prefix):
+        """title.prefix：标题以 prefix 开头的文档，在排好序的标题上二分查找"""
+        prefix = normalize_title(prefix)
+        _, order, sorted_titles = self.title_table()
+        start = bisect_left(sorted_titles, prefix)
+        end = bisect_left(sorted_titles, prefix + "\U0010ffff")
+        matched = np.zeros(self.num_docs, dtype=bool)
+        matched[order[start:end]] = True
+        return matched.astype(np.float64), matched
+
+
+def wildcard_regex(pattern):
+    """Elasticsearch 通配符语法（* 任意个字符，? 一个字符）转为正则表达式"""
+    return re.compile("".join(".*" if c == "*" else "." if c == "?" else re.escape(c) for c in pattern), re.S)
+
+
+def parse_field(spec):
+    """'title^3' -> ('title', 3.0)"""
+    name, _, boost = spec.partition("^")
+    return name, float(boost or 1)
+
+
+FIELD_VALUE_MODIFIERS = {
+    "none": lambda x: x,
+    "log1p": lambda x: np.log10(1 + x),
+    "log2p": lambda x: np.log10(2 + x),
+    "ln1p": np.log1p,
+    "ln2p": lambda x: np.log(2 + x),
+    "sqrt": np.sqrt,
+    "square": np.square,
+}
+
+
+class LocalSearch:
+    """Elasticsearch 客户端的进程内替代，只实现 web.py 使用的部分"""
+
+    def __init__(self, root=None):
+        self.root = root or index_dir
+        self._lock = threading.Lock()
+        self._current = None
+        self._index = None
+
+    def current_index(self):
+        """返回当前版本的 LocalIndex，CURRENT 变化后重新打开"""
+        version = read_current(self.root)
+        if version is None:
+            raise FileNotFoundError(f"No local index in {self.root}, run local_search.py to build one")
+        with self._lock:
+            if version != self._current:
+                self._index = LocalIndex(os.path.join(self.root, version))
+                self._current = version
+            return self._index
+
+    def evaluate(self, index, query):
+        """计算查询对所有文档的 (得分数组, 匹配数组)"""
+        (kind, spec), = query.items()
+        if kind == "match_all":
+            return np.ones(index.num_docs), np.ones(index.num_docs, dtype=bool)
+        if kind == "multi_match":
+            return index.match(spec["query"], [parse_field(f) for f in spec.get("fields", fields)])
+        if kind == "match":
+            (field, value), = spec.items()
+            text = value["query"] if isinstance(value, dict) else value
+            if field == "title.prefix":
+                return index.title_prefix(text)
+            return index.match(text, [(field, 1.0)])
+        if kind == "wildcard":
+            (field, value), = spec.items()
+            pattern = value["value"] if isinstance(value, dict) else value
+            if field == wild_field:
+                return index.title_wildcard(pattern)
+            return index.wildcard(field, pattern)
+        if kind == "constant_score":
+            _, matched = self.evaluate(index, spec["filter"])
+            return matched * spec.get("boost", 1.0), matched
+        if kind == "function_score":
+            scores, matched = self.evaluate(index, spec.get("query", {"match_all": {}}))
+            function_scores = np.zeros(index.num_docs)
+            for function in spec.get("functions", []):
+                factor = function["field_value_factor"]
+                values = np.asarray(index.numeric[factor["field"]], dtype=np.float64)
+                values = np.where(np.isnan(values), factor.get("missing", 0), values)
+                modifier = FIELD_VALUE_MODIFIERS[factor.get("modifier", "none")]
+                function_scores += function.get("weight", 1.0) * modifier(factor.get("factor", 1.0) * values)
+            boost_mode = spec.get("boost_mode", "multiply")
+            if boost_mode == "sum":
+                scores = scores + function_scores
+            elif boost_mode == "replace":
+                scores = function_scores
+            else:
+                scores = scores * function_scores
+            return scores, matched
+        raise ValueError(f"Unsupported query for the local search backend: {kind}")
+
+    def search(self, index=None, body=None, **kwargs):
+        started = time.perf_counter()
+        body = dict(body or {}, **kwargs)
+        local_index = self.current_index()
+        scores, matched = self.evaluate(local_index, body.get("query", {"match_all": {}}))
+        candidates = np.flatnonzero(matched)
+        total = len(candidates)
+
+        size, start = body.get("size", 10), body.get("from", 0)
+        sort_by_id = any("doc_id" in spec for spec in body.get("sort", []) if isinstance(spec, dict))
+        candidate_ids = local_index.doc_ids[candidates] if len(candidates) else np.zeros(0, dtype="S40")
+        if body.get("search_after"):
+            after_score, after_id = body["search_after"][0], body["search_after"][-1]
+            after_id = str(after_id).encode("ascii")
+            keep = (scores[candidates] < after_score) | \
+                   ((scores[candidates] == after_score) & (candidate_ids > after_id))
+            candidates, candidate_ids = candidates[keep], candidate_ids[keep]
+
+        # 先用 argpartition 取出前 start + size 个，再只对它们排序
+        limit = min(start + size, len(candidates))
+        if limit < len(candidates):
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            threshold = scores[candidates][top].min()
+            # 与第 limit 名得分相同的文档都要参与按 doc_id 的排序
+            top = np.flatnonzero(scores[candidates] >= threshold)
+            candidates, candidate_ids = candidates[top], candidate_ids[top]
+        order = np.lexsort((candidate_ids, -scores[candidates]))[start:start + size]
+
+        hits = []
+        for i in order:
+            number = int(candidates[i])
+            hit = {"_index": local_index.version, "_id": candidate_ids[i].decode("ascii"),
+                   "_score": float(scores[number]), "_source": local_index.source(number)}
+            if "sort" in body:
+                hit["sort"] = [hit["_score"], hit["_id"]] if sort_by_id else [hit["_score"]]
+            hits.append(hit)
+        max_score = float(scores[candidates].max()) if len(candidates) else None
+        return {"took": int((time.perf_counter() - started) * 1000), "timed_out": False,
+                "hits": {"total": {"value": total, "relation": "eq"}, "max_score": max_score, "hits": hits}}
+
+    def msearch(self, searches=None, index=None, **kwargs):
+        started = time.perf_counter()
+        responses = []
+        for header, body in zip(searches[::2], searches[1::2]):
+            try:
+                response = self.search(index=header.get("index", index), body=body)
+                response["status"] = 200
+            except ValueError as e:
+                response = {"error": {"type": "parsing_exception", "reason": str(e)}, "status": 400}
+            responses.append(response)
+        return {"took": int((time.perf_counter() - started) * 1000), "responses": responses}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="由爬取结果构建本地 BM25 索引")
+    parser.add_argument("file", nargs="?", default="urls_with_data.jsonl", help="爬取结果文件")
+    parser.add_argument("--index-dir", default=index_dir, help="索引目录")
+    args = parser.parse_args()
+    build_local_index(args.file, args.index_dir)
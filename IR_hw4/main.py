@@ -1,11 +1,30 @@
+import argparse
+
 import catch_url
 import es_createInex
+import metrics
 
 # 文件路径
-txt_file = 'urls_with_data.txt'
+txt_file = 'urls_with_data.jsonl'
+
+
+
+def main(incremental=False):
+    """爬取并建立索引
 
+    incremental 为 True 时进行增量抓取，只把新增或内容有变化的文档写入已有索引。
+    """
+    catch_url.cu(incremental_mode=incremental)
+    if incremental:
+        es_createInex.index_data_to_elasticsearch(catch_url.changed_file)
+    else:
+        # 构建新的版本索引，完成后原子地切换别名
+        es_createInex.rebuild_index(txt_file)
+    metrics.write_summary("index", {"mode": "incremental" if incremental else "rebuild"})
 
 
-def main():
-    catch_url.cu()
-    es_createInex.index_data_to_elasticsearch(txt_file)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="爬取南开大学网站并建立 Elasticsearch 索引")
+    parser.add_argument("--incremental", action="store_true", help="增量抓取并只更新变化的文档")
+    args = parser.parse_args()
+    main(args.incremental)
@@ -0,0 +1,198 @@
+"""轻量的运行时指标：各阶段耗时（直方图）、计数器和瞬时值
+
+    with metrics.timer("web_stage", stage="rerank"):
+        ...
+    metrics.inc("crawl_errors_total", reason="Timeout")
+    metrics.set_gauge("crawl_queue_depth", len(url_queue))
+
+enabled 为 False（或环境变量 IR_METRICS=0）时 timer 返回共享的空上下文，inc / observe / set_gauge 直接返回，
+热路径上只多一次全局变量判断。
+Web 进程在 /metrics 以 Prometheus 文本格式输出（gunicorn 的每个 worker 各自统计）；
+爬虫和建索引等批处理程序结束时用 write_summary 写出本次运行的汇总 JSON。
+"""
+from bisect import bisect_left
+import json
+import os
+import threading
+import time
+
+enabled = os.environ.get("IR_METRICS", "1") != "0"
+prefix = "ir_"  # Prometheus 指标名前缀
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # 直方图上界（秒）
+summary_dir = "run_summaries"  # 批处理运行汇总的目录
+
+_lock = threading.Lock()
+_histograms = {}  # (名称, 标签) -> Histogram
+_counters = {}  # (名称, 标签) -> 值
+_gauges = {}  # (名称, 标签) -> 值
+_collectors = []  # 输出时调用的函数，返回 {名称: 值}，作为瞬时值输出（如缓存的命中数）
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(buckets) + 1)  # 每个区间的次数，最后一个为超过最大上界的部分
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+class _Timer:
+    __slots__ = ("key", "start")
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _observe(self.key, time.perf_counter() - self.start)
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _observe(key, seconds):
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def timer(name, **labels):
+    """测量 with 块的耗时，记入直方图 name"""
+    if not enabled:
+        return _NOOP_TIMER
+    return _Timer(_key(name, labels))
+
+
+def observe(name, seconds, **labels):
+    if enabled:
+        _observe(_key(name, labels), seconds)
+
+
+def inc(name, value=1, **labels):
+    if not enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    if enabled:
+        _gauges[_key(name, labels)] = value
+
+
+def register_collector(func):
+    """注册输出时调用的函数，func() 返回 {名称: 数值}；重复注册同一个函数时忽略"""
+    with _lock:
+        if func not in _collectors:
+            _collectors.append(func)
+
+
+def reset():
+    """清空所有指标（注册的 collector 保留）"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render_prometheus():
+    """Prometheus 文本格式（0.0.4）"""
+    with _lock:
+        histograms = {key: (list(h.counts), h.count, h.sum) for key, h in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        collectors = list(_collectors)
+    for func in collectors:
+        for name, value in func().items():
+            gauges[(name, ())] = value
+
+    lines = []
+    typed = set()
+
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), (counts, count, total) in sorted(histograms.items()):
+        metric = f"{prefix}{name}_seconds"
+        declare(metric, "histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+    for kind, values in (("counter", counters), ("gauge", gauges)):
+        for (name, labels), value in sorted(values.items()):
+            declare(prefix + name, kind)
+            lines.append(f"{prefix}{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """当前指标的字典形式：{"timers": {名称: {count, total_seconds, mean_ms, max_ms}}, "counters", "gauges"}"""
+    def display(name, labels):
+        return name + "".join(f"[{key}={value}]" for key, value in labels)
+
+    with _lock:
+        timers = {display(*key): {"count": h.count, "total_seconds": round(h.sum, 6),
+                                  "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+                                  "max_ms": round(h.max * 1000, 3)}
+                  for key, h in sorted(_histograms.items())}
+        counters = {display(*key): value for key, value in sorted(_counters.items())}
+        gauges = {display(*key): value for key, value in sorted(_gauges.items())}
+    return {"timers": timers, "counters": counters, "gauges": gauges}
+
+
+def write_summary(job, extra=None):
+    """把本次运行的指标写入 summary_dir/<job>-<时间>.json 并清空，返回文件路径；未启用时不写入"""
+    if not enabled:
+        return None
+    os.makedirs(summary_dir, exist_ok=True)
+    path = os.path.join(summary_dir, f"{job}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    summary = {"job": job, "finished": time.strftime("%Y-%m-%d %H:%M:%S"), **(extra or {}), **snapshot()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    reset()
+    print(f"Run summary written to {path}")
+    return path
@@ -0,0 +1,159 @@
+"""按内容寻址、压缩保存的原始网页存档（参照 WARC 的组织方式）
+
+目录结构：
+    pages-<n>.gz   追加写入的数据段，每个页面是一个独立的 gzip 成员，可单独解压
+    objects.jsonl  内容哈希 -> (数据段, 偏移, 长度)，每保存一个新内容追加一行
+    urls.jsonl     URL -> 内容哈希、抓取时间、Content-Type，每次抓取追加一行，后写入的覆盖先写入的
+内容哈希为原始响应体的 sha1，相同内容的页面只保存一份。
+爬虫写入存档；/snapshot 从存档返回网页，索引程序可以从存档重新解析字段而不必重新爬取。
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+segment_size = 256 * 1024 * 1024  # 单个数据段的最大字节数
+
+
+class PageStore:
+    """原始网页存档，读写都是线程安全的
+
+    只有一个进程写入；读取方在找不到 URL 时调用 refresh() 加载其它进程新写入的索引。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._objects = {}  # 内容哈希 -> (数据段, 偏移, 长度)
+        self._urls = {}  # URL -> {"hash", "time", "content_type"}
+        self._offsets = {"objects.jsonl": 0, "urls.jsonl": 0}  # 已加载的索引文件长度
+        self._lock = threading.Lock()
+        self._segment = None  # 当前写入的数据段文件
+        self._segment_name = None
+        self._object_log = None
+        self._url_log = None
+        self.refresh()
+
+    def _load_index(self, name, apply):
+        """加载索引文件中上次读取之后新增的完整行"""
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            f.seek(self._offsets[name])
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # 忽略写了一半的最后一行
+        for line in data[:end].splitlines():
+            apply(json.loads(line))
+        self._offsets[name] += end
+
+    def refresh(self):
+        """加载其它进程新写入的索引"""
+        def add_object(entry):
+            self._objects[entry["hash"]] = (entry["segment"], entry["offset"], entry["length"])
+
+        def add_url(entry):
+            self._urls[entry.pop("url")] = entry
+
+        with self._lock:
+            self._load_index("objects.jsonl", add_object)
+            self._load_index("urls.jsonl", add_url)
+
+    def _open_for_write(self, length):
+        """打开写入用的文件，当前数据段超过 segment_size 时换一个新的数据段"""
+        if self._object_log is None:
+            self._object_log = open(os.path.join(self.root, "objects.jsonl"), "a", encoding="utf-8")
+            self._url_log = open(os.path.join(self.root, "urls.jsonl"), "a", encoding="utf-8")
+        if self._segment is not None and self._segment.tell() + length <= segment_size:
+            return
+        if self._segment is not None:
+            self._segment.close()
+        segments = sorted(int(name[6:-3]) for name in os.listdir(self.root)
+                          if name.startswith("pages-") and name.endswith(".gz"))
+        number = segments[-1] if segments else 0
+        path = os.path.join(self.root, f"pages-{number}.gz")
+        if os.path.exists(path) and os.path.getsize(path) + length > segment_size:
+            number += 1
+        self._segment_name = f"pages-{number}.gz"
+        self._segment = open(os.path.join(self.root, self._segment_name), "ab")
+
+    def put(self, url, content, content_type=None, content_hash=None):
+        """保存一个页面的原始内容，返回内容哈希；内容已存在时只更新 URL 索引"""
+        content_hash = content_hash or hashlib.sha1(content).hexdigest()
+        with self._lock:
+            stored = content_hash in self._objects
+            previous = self._urls.get(url)
+        compressed = None if stored else gzip.compress(content, compresslevel=6)
+
+        with self._lock:
+            self._open_for_write(len(compressed) if compressed else 0)
+            if compressed is not None and content_hash not in self._objects:
+                offset = self._segment.tell()
+                self._segment.write(compressed)
+                self._objects[content_hash] = (self._segment_name, offset, len(compressed))
+                self._object_log.write(json.dumps({"hash": content_hash, "segment": self._segment_name,
+                                                   "offset": offset, "length": len(compressed)}) + "\n")
+            if previous is None or previous["hash"] != content_hash:
+                entry = {"hash": content_hash, "time": time.time(), "content_type": content_type}
+                self._urls[url] = entry
+                self._url_log.write(json.dumps(dict(entry, url=url), ensure_ascii=False) + "\n")
+        return content_hash
+
+    def flush(self, sync=False):
+        """把数据段和索引写入磁盘；数据段先于索引落盘，索引中的条目总能找到内容"""
+        with self._lock:
+            files = [self._segment, self._object_log, self._url_log]
+            for f in files:
+                if f is not None:
+                    f.flush()
+                    if sync:
+                        os.fsync(f.fileno())
+
+    def close(self):
+        self.flush(sync=True)
+        with self._lock:
+            for f in (self._segment, self._object_log, self._url_log):
+                if f is not None:
+                    f.close()
+            self._segment = self._object_log = self._url_log = None
+
+    def get_by_hash(self, content_hash):
+        """按内容哈希读取原始内容，不存在时返回 None"""
+        with self._lock:
+            location = self._objects.get(content_hash)
+        if location is None:
+            return None
+        segment, offset, length = location
+        with open(os.path.join(self.root, segment), "rb") as f:
+            f.seek(offset)
+            return gzip.decompress(f.read(length))
+
+    def info(self, url):
+        """URL 最近一次抓取的 {"hash", "time", "content_type"}，不存在时返回 None"""
+        with self._lock:
+            entry = self._urls.get(url)
+        return dict(entry) if entry else None
+
+    def get(self, url):
+        """读取 URL 最近一次抓取的原始内容，不存在时返回 None"""
+        entry = self.info(url)
+        return self.get_by_hash(entry["hash"]) if entry else None
+
+    def urls(self):
+        with self._lock:
+            return list(self._urls)
+
+    def __contains__(self, url):
+        with self._lock:
+            return url in self._urls
+
+    def __len__(self):
+        with self._lock:
+            return len(self._urls)
+
+    def stats(self):
+        with self._lock:
+            return {"urls": len(self._urls), "objects": len(self._objects),
+                    "compressed_bytes": sum(length for _, _, length in self._objects.values())}
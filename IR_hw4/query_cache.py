@@ -0,0 +1,117 @@
+"""检索结果缓存
+
+在进程内缓存 Elasticsearch 的检索结果（个性化重排序之前、与用户无关的部分），
+容量有上限（LRU 淘汰），每项有过期时间（TTL），并统计命中 / 未命中次数。
+
+索引发生变化（重建后切换别名、回滚、增量更新）时，es_createInex 会改写版本标记文件
+version_file；缓存每次读取前检查该文件，发现变化就清空，因此多个 Web 进程也能及时失效。
+"""
+from collections import OrderedDict
+import os
+import threading
+import time
+
+version_file = "index_version.txt"  # 索引版本标记文件，内容为当前版本和修改时间
+
+
+def mark_index_changed(version):
+    """改写版本标记文件，通知所有缓存索引已变化"""
+    tmp_file = version_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(f"{version} {time.time():.6f}\n")
+    os.replace(tmp_file, version_file)
+
+
+def read_index_version():
+    """返回版本标记文件的内容，文件不存在时返回 None"""
+    try:
+        with open(version_file, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def normalize_query(query):
+    """缓存键使用的查询文本：合并空白并统一为小写（multi_match 和标题通配符查询都不区分大小写）"""
+    return " ".join(query.split()).lower()
+
+
+class QueryCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()  # 键 -> (过期时间, 值)
+        self._lock = threading.Lock()
+        self._version_stat = None  # 上次检查时版本标记文件的 (inode, 修改时间)
+        self.version = read_index_version()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def _check_version(self):
+        """版本标记文件变化时清空缓存（调用时需持有锁）"""
+        try:
+            stat = os.stat(version_file)
+            current = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            current = None
+        if current == self._version_stat:
+            return
+        self._version_stat = current
+        version = read_index_version()
+        if version != self.version:
+            self.version = version
+            if self._items:
+                self.invalidations += 1
+            self._items.clear()
+
+    def get(self, key):
+        """返回缓存的值，不存在或已过期时返回 None"""
+        with self._lock:
+            self._check_version()
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._check_version()
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        """命中 / 未命中等计数"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "index_version": self.version,
+            }
@@ -0,0 +1,139 @@
+"""爬取结果的记录格式（JSONL）
+
+每行一个 JSON 对象，字段如下：
+    schema       记录格式版本号（SCHEMA_VERSION）
+    url          页面或下载链接的 URL
+    title        标题
+    description  meta 描述
+    anchor_text  锚文本列表
+    content      正文（下载链接为空）
+    page_rank    PageRank 值
+
+iter_records 也能读取早期爬虫输出的纯文本格式（urls_with_content.txt）：
+每条记录以 "URL: " 行开始，之后是 "Title: " 和 "Anchor Texts: "（锚文本以 ", " 分隔）两行，
+标题可能跨越多行。这种格式没有描述、正文和 PageRank，这些字段为默认值。
+"""
+import ast
+import hashlib
+import json
+import os
+import re
+
+SCHEMA_VERSION = 1
+
+RECORD_FIELDS = {
+    "url": "",
+    "title": "",
+    "description": "",
+    "anchor_text": [],
+    "content": "",
+    "page_rank": 0.0,
+}
+
+
+def make_record(data):
+    """按当前版本的字段补全一条记录"""
+    record = {"schema": SCHEMA_VERSION}
+    for field, default in RECORD_FIELDS.items():
+        value = data.get(field, default)
+        record[field] = list(value) if isinstance(default, list) else value
+    return record
+
+
+def dumps_record(data):
+    """把一条记录序列化为一行 JSON（包含换行符）"""
+    return json.dumps(make_record(data), ensure_ascii=False) + "\n"
+
+
+def parse_legacy_line(line):
+    """解析旧版 urls_with_data.txt 中的一行（Python dict 的 repr，可能含 np.float64(...)）"""
+    line = re.sub(r'np\.float64\((.*?)\)', r'\1', line)
+    return ast.literal_eval(line)
+
+
+TEXT_LINE_RE = re.compile(r"^(URL|Title|Anchor Texts):(.*)$")
+
+
+def iter_text_records(lines):
+    """解析 urls_with_content.txt 的纯文本格式"""
+    data = None
+    field = None  # 当前正在读取的字段，只有标题会有续行
+    for line in lines:
+        line = line.rstrip("\n")
+        match = TEXT_LINE_RE.match(line)
+        if match and match.group(1) == "URL":
+            if data is not None:
+                yield data
+            data, field = {"url": match.group(2).strip()}, None
+        elif data is None:
+            continue
+        elif match and match.group(1) == "Title":
+            data["title"], field = match.group(2).strip(), "title"
+        elif match:
+            data["anchor_text"] = [text for text in match.group(2).strip().split(", ") if text]
+            field = None
+        elif field == "title" and line.strip():
+            data["title"] = " ".join([data["title"], line.strip()]).strip()
+    if data is not None:
+        yield data
+
+
+def iter_records(file_path):
+    """逐行读取记录文件，兼容旧版的 dict repr 格式和纯文本格式；无法解析的行会被跳过"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        first = f.readline()
+        f.seek(0)
+        if TEXT_LINE_RE.match(first) and first.startswith("URL:"):
+            yield from iter_text_records(f)
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                if line.startswith('{"'):
+                    data = json.loads(line)
+                else:
+                    data = parse_legacy_line(line)
+            except (ValueError, SyntaxError) as e:
+                print(f"Failed to parse line: {line[:200]}\nError: {e}")
+                continue
+            yield data
+
+
+def attach_pagerank(file_path, scores, output_path=None):
+    """第二遍流式处理：为每条记录写入 PageRank，不把整个文件读入内存
+
+    output_path 为空时原地替换 file_path。
+    """
+    output_path = output_path or file_path
+    with open(output_path + ".tmp", "w", encoding="utf-8") as out:
+        for data in iter_records(file_path):
+            data["page_rank"] = scores.get(data.get("url"), 0.0)
+            out.write(dumps_record(data))
+    os.replace(output_path + ".tmp", output_path)
+
+
+def doc_id(url):
+    """由 URL 生成稳定的文档 id，重新索引同一个 URL 时会覆盖旧文档"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def make_doc(record):
+    """把一条爬取记录转换为索引文档（Elasticsearch 和 local_search.py 共用）"""
+    # 限制锚文本数量为最多 5 个
+    anchor_texts = record.get('anchor_text', [])[:5]
+
+    url = record.get('url', '')
+    title = record.get('title', 'No Title')
+    if isinstance(title, str):
+        # 合并连续的空白：title.wild 对原文做通配符匹配，查询改写时模式中的空白也已合并
+        title = " ".join(title.split())
+    return {
+        "doc_id": doc_id(url),
+        "url": url,
+        "title": title,
+        "anchor_text": anchor_texts,
+        "description": record.get('description', ''),
+        "pagerank": record.get('page_rank', 0.0)
+    }
@@ -0,0 +1,101 @@
+"""检索结果的个性化重排序
+
+对一次查询的全部结果只构建一次词项矩阵，用稀疏矩阵乘法同时算出
+每个结果与查询、与每条历史记录的余弦相似度，再与 PageRank 加权综合。
+结果所在的版本索引有预先计算的文档向量（见 doc_vectors.py）时，
+只对查询和历史记录做向量化；否则按标题现场构建 TF-IDF 矩阵。
+"""
+import numpy as np
+
+import doc_vectors
+
+# 加权综合评分的权重
+weight_history = 0.6
+weight_query = 0.2
+weight_pagerank = 0.2
+
+
+def compute_similarities(query, titles, history):
+    """返回 (历史相似度, 查询相似度)，均为与 titles 等长的数组
+
+    历史相似度为标题与每条历史记录余弦相似度之和。
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer  # 导入较慢，第一次重排序时才导入
+
+    num_titles = len(titles)
+    history = [item.strip() for item in history]
+    try:
+        # TfidfVectorizer 默认对每一行做 L2 归一化，矩阵乘积即为余弦相似度
+        matrix = TfidfVectorizer().fit_transform(titles + history + [query])
+    except ValueError:
+        # 所有文本都没有可用的词
+        return np.zeros(num_titles), np.zeros(num_titles)
+
+    title_matrix = matrix[:num_titles]
+    history_matrix = matrix[num_titles:num_titles + len(history)]
+    query_vector = matrix[num_titles + len(history):]
+
+    historical = np.asarray((title_matrix @ history_matrix.T).sum(axis=1)).ravel()
+    query_sims = (title_matrix @ query_vector.T).toarray().ravel()
+    return historical, query_sims
+
+
+def compute_similarities_precomputed(store, query, hits, history):
+    """与 compute_similarities 相同，但结果文档的向量来自索引时保存的 store"""
+    history = [item.strip() for item in history]
+    doc_matrix = store.lookup([hit['_id'] for hit in hits], [hit['_source'] for hit in hits])
+    text_matrix = store.transform(history + [query])
+
+    similarities = doc_vectors.cosine(doc_matrix, text_matrix)
+    return similarities[:, :len(history)].sum(axis=1), similarities[:, len(history)]
+
+
+def normalize(scores):
+    """把得分线性归一化到 [0, 1]，所有得分相同时全部为 0"""
+    scores = np.asarray(scores, dtype=float)
+    if not len(scores):
+        return scores
+    min_score, max_score = scores.min(), scores.max()
+    if max_score == min_score:
+        return np.zeros(len(scores))
+    return (scores - min_score) / (max_score - min_score)
+
+
+def get_pagerank(source):
+    """读取文档的 PageRank（索引字段为 pagerank，旧数据中为 page_rank）"""
+    return source.get('pagerank', source.get('page_rank', 0)) or 0
+
+
+def rerank(query, hits, history, use_engine_score=False):
+    """按历史相似度、查询相似度和 PageRank 的加权得分对 hits 重新排序
+
+    use_engine_score 为 True 时 hits 的 _score 已包含文本相关度和 PageRank（function_score），
+    只把它与历史相似度加权；没有历史记录时直接保持 Elasticsearch 的顺序。
+    """
+    if not hits:
+        return []
+    if use_engine_score and not history:
+        return list(hits)
+    # 结果都来自同一个版本索引且该版本有旁路文件时使用预先计算的向量
+    indices = {hit.get('_index') for hit in hits}
+    store = None
+    if len(indices) == 1 and None not in indices and all('_id' in hit for hit in hits):
+        store = doc_vectors.get_store(next(iter(indices)))
+    if store is not None:
+        historical, query_sims = compute_similarities_precomputed(store, query, hits, history)
+    else:
+        titles = [hit['_source'].get('title', '').strip() for hit in hits]
+        historical, query_sims = compute_similarities(query, titles, history)
+    if use_engine_score:
+        engine_scores = [hit.get('_score') or 0 for hit in hits]
+        weighted_scores = (weight_history * normalize(historical) +
+                           (weight_query + weight_pagerank) * normalize(engine_scores))
+    else:
+        pageranks = [get_pagerank(hit['_source']) for hit in hits]
+        weighted_scores = (weight_history * normalize(historical) +
+                           weight_query * normalize(query_sims) +
+                           weight_pagerank * normalize(pageranks))
+
+    # 稳定排序，得分相同时保持 Elasticsearch 的原始顺序
+    order = np.argsort(-weighted_scores, kind="stable")
+    return [hits[i] for i in order]
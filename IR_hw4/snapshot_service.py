@@ -0,0 +1,240 @@
+"""网页截图快照服务
+
+固定数量的工作线程各自持有一个可复用的浏览器会话，截图请求放入任务队列后立即返回任务 id，
+请求处理函数不再等待浏览器启动和页面加载。
+    - 同一 URL 正在排队或截图时，新的请求直接返回已有的任务（合并）
+    - 完成的 PNG 按 URL 的 sha1 保存在 cache_dir 中，cache_ttl 内的重复请求直接使用
+    - 浏览器由 driver_factory 创建，只需提供 get(url) / save_screenshot(path) / quit()，
+      测试时可以换成不启动浏览器的假驱动
+    - 任务状态同时写入 cache_dir/jobs/<任务 id>.json，多进程部署时其它进程也能查询任务
+    - 只接受 allowed_domains（与爬虫的抓取范围一致）中的 http / https URL：截图会返回给用户，
+      file:// 或内网地址（如 Elasticsearch）的截图等同于读取本地文件和 SSRF；重定向到范围外的页面也不截图
+"""
+from collections import OrderedDict
+from urllib.parse import urlparse
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+allowed_domains = ("nankai.edu.cn",)  # 允许截图的域名（包括子域名）
+
+
+def is_allowed_url(url):
+    """URL 是否为 allowed_domains 中的 http / https 地址（按主机名判断，不受用户名、端口影响）"""
+    try:
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").lower().rstrip(".")
+    except ValueError:
+        return False
+    return parsed.scheme in ("http", "https") and any(
+        host == domain or host.endswith("." + domain) for domain in allowed_domains)
+
+
+def chrome_driver():
+    """创建无头 Chrome 会话（需要 selenium 和 chromedriver）"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless=new")  # 设置无头模式
+    options.add_argument("--disable-gpu")
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(30)
+    return driver
+
+
+class QueueFull(Exception):
+    """等待截图的任务太多"""
+
+
+class URLNotAllowed(ValueError):
+    """URL 不是允许截图的 http / https 地址"""
+
+
+class SnapshotJob:
+    def __init__(self, url, path):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.path = path
+        self.status = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {"id": self.id, "url": self.url, "status": self.status, "error": self.error,
+                "created": self.created, "finished": self.finished}
+
+    @classmethod
+    def from_dict(cls, data, path):
+        """由其它进程保存的任务状态重建任务（只用于查询）"""
+        job = cls(data["url"], path)
+        job.id, job.status, job.error = data["id"], data["status"], data["error"]
+        job.created, job.finished = data["created"], data["finished"]
+        if job.status in (DONE, FAILED):
+            job.done.set()
+        return job
+
+
+class SnapshotService:
+    """浏览器会话池 + 任务队列"""
+
+    def __init__(self, driver_factory=chrome_driver, pool_size=2, cache_dir="screenshot_snapshots",
+                 cache_ttl=24 * 3600, max_queue=100, max_jobs=1000):
+        self.driver_factory = driver_factory
+        self.pool_size = pool_size
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self.max_jobs = max_jobs  # 最多保留的任务记录数，超出后丢弃最早的
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()  # 任务 id -> SnapshotJob
+        self._in_flight = {}  # URL -> 排队或执行中的 SnapshotJob
+        self._lock = threading.Lock()
+        self._workers = []
+        self.coalesced = self.cache_hits = self.completed = self.failed = 0
+
+    def cache_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".png")
+
+    def _job_file(self, job_id):
+        return os.path.join(self.cache_dir, "jobs", job_id + ".json")
+
+    def _save_job(self, job):
+        """把任务状态写入任务文件（先写临时文件再改名）"""
+        path = self._job_file(job.id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(path + ".tmp", path)
+
+    def _load_job(self, job_id):
+        """读取其它进程保存的任务状态，不存在时返回 None"""
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):  # 任务 id 来自请求，不能用作任意路径
+            return None
+        try:
+            with open(self._job_file(job_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return SnapshotJob.from_dict(data, self.cache_path(data["url"]))
+
+    def _cached(self, path):
+        try:
+            return time.time() - os.path.getmtime(path) < self.cache_ttl
+        except OSError:
+            return False
+
+    def _start_workers(self):
+        """第一次提交任务时才启动工作线程（调用时需持有锁）"""
+        if self._workers:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for i in range(self.pool_size):
+            worker = threading.Thread(target=self._work, name=f"snapshot-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        self._save_job(job)
+        while len(self._jobs) > self.max_jobs:
+            _, old = self._jobs.popitem(last=False)
+            try:
+                os.remove(self._job_file(old.id))
+            except OSError:
+                pass
+
+    def submit(self, url):
+        """提交截图任务并立即返回 SnapshotJob；URL 不允许时抛出 URLNotAllowed，队列已满时抛出 QueueFull"""
+        if not is_allowed_url(url):
+            raise URLNotAllowed(f"Only http(s) pages on {', '.join(allowed_domains)} can be captured")
+        path = self.cache_path(url)
+        with self._lock:
+            job = self._in_flight.get(url)
+            if job is not None:
+                self.coalesced += 1
+                return job
+            job = SnapshotJob(url, path)
+            if self._cached(path):
+                self.cache_hits += 1
+                job.status, job.finished = DONE, time.time()
+                job.done.set()
+                self._remember(job)
+                return job
+            self._start_workers()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"{self._queue.qsize()} snapshot jobs are already waiting")
+            self._in_flight[url] = job
+            self._remember(job)
+        return job
+
+    def get(self, job_id):
+        """返回任务，本进程没有时读取其它进程保存的任务状态；不存在时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load_job(job_id)
+
+    def _work(self):
+        driver = None
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            job.status = RUNNING
+            try:
+                if driver is None:
+                    driver = self.driver_factory()
+                driver.get(job.url)
+                # 页面可能重定向到其它地址，只截取仍在允许范围内的页面
+                if not is_allowed_url(getattr(driver, "current_url", job.url)):
+                    raise URLNotAllowed(f"{job.url} redirected outside {', '.join(allowed_domains)}")
+                # 先写临时文件再改名，读取方不会看到写了一半的图片
+                tmp_path = f"{job.path}.{threading.get_ident()}.tmp"
+                driver.save_screenshot(tmp_path)
+                os.replace(tmp_path, job.path)
+                job.status = DONE
+            except Exception as e:
+                job.status, job.error = FAILED, str(e)
+                # 浏览器会话可能已损坏，下一个任务重新创建
+                if driver is not None:
+                    try:
+                        driver.quit()
+                    except Exception:
+                        pass
+                    driver = None
+            job.finished = time.time()
+            with self._lock:
+                self._in_flight.pop(job.url, None)
+                if job.status == DONE:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                if job.id in self._jobs:
+                    self._save_job(job)
+            job.done.set()
+        if driver is not None:
+            driver.quit()
+
+    def shutdown(self):
+        """等待已排队的任务完成后关闭所有浏览器会话"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join()
+
+    def stats(self):
+        with self._lock:
+            return {"pool_size": self.pool_size, "queued": self._queue.qsize(), "in_flight": len(self._in_flight),
+                    "completed": self.completed, "failed": self.failed, "coalesced": self.coalesced,
+                    "cache_hits": self.cache_hits}
@@ -0,0 +1,227 @@
+"""查询自动补全
+
+候选短语来自两部分：
+    - 建索引时收集的标题和锚文本（每个版本索引一个旁路文件 suggest_dir/<版本>.json，由 PhraseWriter 写入）
+    - 所有用户的查询历史，启动时从数据库读取每个查询的搜索用户，之后每次保存查询时增量更新；
+      查询的权重按搜索过它的不同用户数计算，只有一个用户搜索过的查询不会出现在其他人的补全中
+短语统一为小写、合并空白后作为键，保存在排好序的数组中；前缀对应数组中连续的一段，用二分查找定位。
+每个前缀的前 max_k 个结果（按权重）缓存起来：一两个字的前缀对应的范围很大，加载时预先计算并常驻，
+更长的前缀按 LRU 缓存。权重只会增加，新增查询时直接更新各级前缀的缓存结果，不需要清空。
+补全请求只访问内存，不访问 Elasticsearch。
+"""
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+import heapq
+import json
+import os
+import threading
+
+import query_cache
+
+suggest_dir = "suggestions"  # 旁路文件目录
+max_phrase_length = 64  # 更长的标题 / 锚文本不作为候选
+max_k = 10  # 每个前缀缓存的结果数
+pinned_length = 2  # 不超过该长度的前缀在加载时预先计算，不会被淘汰
+cache_size = 4096  # 更长前缀的 LRU 缓存容量
+history_weight = 5  # 每个搜索过该查询的用户相当于多少次标题 / 锚文本出现
+min_query_users = 2  # 查询至少被这么多不同的用户搜索过才作为候选，避免把个别用户的查询展示给其他人
+
+
+def normalize(text):
+    return " ".join(str(text or "").split()).lower()
+
+
+def phrases_path(index):
+    return os.path.join(suggest_dir, f"{index}.json")
+
+
+class PhraseWriter:
+    """建索引时收集标题和锚文本，与 doc_vectors.DocVectorWriter 一样通过 add(doc_id, source) 接收文档"""
+
+    def __init__(self):
+        self._counts = Counter()  # 键 -> 出现次数
+        self._display = {}  # 键 -> 第一次出现时的原文
+
+    def add(self, doc_id, source):
+        anchors = source.get('anchor_text') or []
+        if isinstance(anchors, str):
+            anchors = [anchors]
+        for text in [source.get('title')] + list(anchors):
+            key = normalize(text)
+            if not key or len(key) > max_phrase_length or key == "no title":
+                continue
+            self._counts[key] += 1
+            self._display.setdefault(key, " ".join(str(text).split()))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([[self._display[key], count] for key, count in self._counts.items()], f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return len(self._counts)
+
+
+def save_phrases(writer, index):
+    count = writer.save(phrases_path(index))
+    print(f"Saved {count} suggestion phrases to {phrases_path(index)}")
+    return count
+
+
+def delete_phrases(index):
+    try:
+        os.remove(phrases_path(index))
+    except FileNotFoundError:
+        pass
+
+
+class SuggestIndex:
+    """排好序的短语数组 + 前缀 top-k 缓存，线程安全"""
+
+    def __init__(self, query_users=None):
+        self._keys = []  # 排好序的键
+        self._entries = {}  # 键 -> [原文, 标题 / 锚文本次数, 搜索过的用户数]
+        self._users = {}  # 键 -> 搜索过该查询的用户名集合
+        self._pinned = {}  # 短前缀 -> 前 max_k 个键
+        self._cache = OrderedDict()  # 长前缀 -> 前 max_k 个键（LRU）
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version_stat = None  # 上次检查时索引版本标记文件的 (inode, 修改时间)
+        self._version = None
+        self.hits = self.misses = 0
+        for query, username in (query_users or []):
+            self._add(query, username)
+
+    def weight(self, key):
+        _, index_count, user_count = self._entries[key]
+        return index_count + (history_weight * user_count if user_count >= min_query_users else 0)
+
+    def _rank(self, keys):
+        """按权重从高到低（相同时按键）取前 max_k 个有效的键"""
+        ranked = heapq.nsmallest(max_k, ((-self.weight(key), key) for key in keys))
+        return [key for weight, key in ranked if weight < 0]
+
+    def _add(self, text, username=None, index_count=0):
+        key = normalize(text)
+        if not key or len(key) > max_phrase_length:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [" ".join(str(text).split()), 0, 0]
+            if self._loaded:
+                insort(self._keys, key)
+        entry[1] += index_count
+        if username is not None:
+            users = self._users.setdefault(key, set())
+            if username not in users:
+                users.add(username)
+                entry[2] += 1
+        return key
+
+    def _check_version(self):
+        """索引版本变化时重新加载标题和锚文本（调用时需持有锁）"""
+        try:
+            stat = os.stat(query_cache.version_file)
+            current = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            current = None
+        if self._loaded and current == self._version_stat:
+            return
+        self._version_stat = current
+        version = (query_cache.read_index_version() or "").split(" ")[0] or None
+        if self._loaded and version == self._version:
+            return
+        self._version = version
+        self._load(version)
+
+    def _load(self, version):
+        """用 version 的旁路文件替换标题和锚文本部分，保留查询历史，并重建数组和缓存"""
+        self._loaded = False  # 加载期间新增的键不逐个插入数组，最后统一排序
+        for key in [key for key, entry in self._entries.items() if entry[1]]:
+            if self._entries[key][2]:
+                self._entries[key][1] = 0
+            else:
+                del self._entries[key]
+        if version is not None and os.path.exists(phrases_path(version)):
+            with open(phrases_path(version), "r", encoding="utf-8") as f:
+                for text, count in json.load(f):
+                    self._add(text, index_count=count)
+        self._keys = sorted(self._entries)
+        self._loaded = True
+        self._cache.clear()
+        # 一次扫描算出所有短前缀的结果
+        heaps = {}
+        for key in self._keys:
+            item = (self.weight(key), _Reversed(key))
+            for length in range(1, min(pinned_length, len(key)) + 1):
+                heap = heaps.setdefault(key[:length], [])
+                if len(heap) < max_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+        self._pinned = {prefix: [item[1].key for item in sorted(heap, reverse=True) if item[0] > 0]
+                        for prefix, heap in heaps.items()}
+
+    def add_query(self, query, username):
+        """记录 username 的一次查询，并更新包含它的各前缀的缓存结果"""
+        with self._lock:
+            key = self._add(query, username)
+            if key is None or not self._loaded:
+                return
+            for length in range(1, len(key) + 1):
+                prefix = key[:length]
+                cached = self._pinned if length <= pinned_length else self._cache
+                top = cached.get(prefix)
+                if top is None:
+                    if length <= pinned_length:
+                        self._pinned[prefix] = self._rank([key])
+                    continue
+                # 权重只增不减，新的结果一定在原来的结果和这个键之中
+                cached[prefix] = self._rank(set(top) | {key})
+
+    def suggest(self, prefix, k=max_k):
+        """返回以 prefix 开头的前 k 个短语（原文）"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            self._check_version()
+            if len(prefix) <= pinned_length:
+                top = self._pinned.get(prefix, [])
+                self.hits += 1
+            else:
+                top = self._cache.get(prefix)
+                if top is not None:
+                    self._cache.move_to_end(prefix)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    start = bisect_left(self._keys, prefix)
+                    end = bisect_left(self._keys, prefix + "\U0010ffff")
+                    top = self._cache[prefix] = self._rank(self._keys[start:end])
+                    while len(self._cache) > cache_size:
+                        self._cache.popitem(last=False)
+            return [self._entries[key][0] for key in top[:k]]
+
+    def stats(self):
+        with self._lock:
+            return {"phrases": len(self._entries), "pinned_prefixes": len(self._pinned),
+                    "cached_prefixes": len(self._cache), "hits": self.hits, "misses": self.misses,
+                    "index_version": self._version}
+
+
+class _Reversed:
+    """权重相同时让字典序靠前的键排在前面（堆中按 (权重, _Reversed(键)) 比较）"""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return self.key > other.key
+
+    def __gt__(self, other):
+        return self.key < other.key
+
+    def __eq__(self, other):
+        return self.key == other.key
@@ -1,64 +1,58 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+import time
+
+_import_start = time.perf_counter()
+
+from flask import Flask, Response, render_template, request, redirect, url_for, session, jsonify, send_file, abort, g
 from flask_session import Session
-from elasticsearch import Elasticsearch
+import base64
+import binascii
 import json
+import math
 import re
 import os
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-
-
-from PIL import Image
-if not os.path.exists('html_snapshots'):
-    os.makedirs('html_snapshots')
-
-if not os.path.exists('screenshot_snapshots'):
-    os.makedirs('screenshot_snapshots')
-
-# 创建 history 文件夹（如果不存在）
-if not os.path.exists('history'):
-    os.makedirs('history')
-
-# 创建 Flask 应用
-app = Flask(__name__, template_folder=os.path.join(os.getcwd(), 'web'))
-
-# 配置 Flask-Session
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SECRET_KEY'] = 'your_secret_key_here'
-Session(app)
-
-# 创建 Elasticsearch 客户端
-es = Elasticsearch([{'host': 'localhost', 'port': 9200, 'scheme': 'http'}])
-
-# 用户账户密码存储路径
-users_file = 'users.json'
-
-
-def compute_cosine_similarity(query, document):
-    """计算查询词与文档的余弦相似度"""
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform([query, document])
-    cosine_sim = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
-    return cosine_sim[0][0]
-
-
-
-def load_users():
-    """加载用户数据"""
-    if os.path.exists(users_file):
-        with open(users_file, 'r') as f:
-            return json.load(f)
-    return {}
-
-
-def save_users(users):
-    """保存用户数据"""
-    with open(users_file, 'w') as f:
-        json.dump(users, f)
+import secrets
+
+import metrics
+from history_store import HistoryStore
+from page_store import PageStore
+from query_cache import QueryCache, normalize_query
+from snapshot_service import SnapshotService, QueueFull, URLNotAllowed, DONE
+from rerank import rerank
+from suggest import SuggestIndex
+
+# selenium 和 sklearn 在第一次截图 / 重排序时才导入，不计入启动时间
+import_seconds = time.perf_counter() - _import_start
+
+# 默认配置，可以在 create_app(config) 中覆盖
+default_config = {
+    'SESSION_TYPE': 'filesystem',
+    'SECRET_KEY': os.environ.get('SECRET_KEY'),  # 会话签名密钥，必须设置（环境变量 SECRET_KEY）
+    'ES_HOSTS': [{'host': 'localhost', 'port': 9200, 'scheme': 'http'}],
+    'ES_CONNECTIONS': 32,  # 每个 Elasticsearch 节点保持的 keep-alive 连接数，不少于服务器线程数
+    'ES_TIMEOUT': 10,  # 单个 Elasticsearch 请求的超时时间（秒）
+    'SEARCH_BACKEND': 'elasticsearch',  # 'elasticsearch' 或 'local'（进程内 BM25 索引，见 local_search.py）
+    'LOCAL_INDEX_DIR': 'local_index',
+    'HISTORY_DB': 'search.db',
+    'PAGE_STORE_DIR': 'page_store',
+    'SNAPSHOT_DIR': 'screenshot_snapshots',
+    'SNAPSHOT_POOL_SIZE': 2,
+    'RESULT_CACHE_SIZE': 1024,
+    'RESULT_CACHE_TTL': 300,
+    'METRICS_ENABLED': metrics.enabled,  # 各阶段耗时和 /metrics；关闭后计时为空操作（也可设置 IR_METRICS=0）
+}
+
+# 以下对象在 create_app 中创建，每个进程一份；路由直接使用这些全局对象，因此每个进程只能创建一个应用
+_app = None
+es = None  # Elasticsearch 客户端（内部维护连接池），或接口相同的 local_search.LocalSearch
+history_store = None  # 用户账户和查询历史（SQLite，按批写入，见 history_store.py）
+page_store = None  # 爬虫保存的原始网页存档，HTML 快照直接从这里读取，不访问外网
+snapshot_service = None  # 截图快照服务：固定数量的浏览器会话，请求排队后立即返回任务 id
+result_cache = None  # 检索结果缓存：保存去重后、个性化重排序前的结果，索引版本变化时自动失效
+suggest_index = None  # 查询自动补全：标题、锚文本和所有用户的查询历史，只在内存中查找
+
+
+class SearchError(Exception):
+    """检索后端（Elasticsearch 或 local_search）在 msearch 的某个子查询中返回错误"""
 
 
 def clean_url(url):
@@ -71,163 +65,176 @@ def clean_url(url):
 # Elasticsearch 索引名称
 index_name = 'nankai_url_final'
 
+num_recommendations = 5  # 个性化推荐的条数
+page_size = 10  # 每页从 Elasticsearch 取回的结果数（按标题去重后可能更少）
+
+# 排序方式：
+#   'engine' 在 Elasticsearch 中用 function_score 把 PageRank 计入所有候选文档的得分，
+#            Python 端只根据用户历史做轻量的个性化调整
+#   'python' 只用文本相关度检索，再在 Python 端按历史相似度、查询相似度和 PageRank 重排序
+scoring_mode = 'engine'
+pagerank_factor = 10000  # PageRank 的缩放系数，约为文档总数，使普通页面缩放后约为 1
+pagerank_weight = 1.0  # log(1 + pagerank_factor * pagerank) 加到相关度得分上的权重
+
+# 检索字段及权重（与 es_createInex.index_mapping 中的字段一致）
+search_fields = [
+    "title^3",  # 给标题更高的权重
+    "description^2",  # 给描述适中的权重
+    "anchor_text^2",  # 给锚文本权重
+    "url^1"  # 给 URL 加上权重
+]
+title_prefix_max_chars = 20  # 与 es_createInex.title_prefix_max_chars 相同，更长的前缀改用 title.wild
+
+
+def encode_cursor(sort_values):
+    """把上一页最后一条结果的排序值编码为页面表单中的游标"""
+    data = json.dumps(sort_values, ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """解码游标，为空、无法解析或不是 [得分, doc_id] 形式时返回 None（即第一页）"""
+    if not cursor:
+        return None
+    try:
+        sort_values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, binascii.Error):
+        return None
+    # 被篡改的游标直接交给 search_after 会导致 Elasticsearch 返回 400
+    if not (isinstance(sort_values, list) and len(sort_values) == 2):
+        return None
+    score, doc_id = sort_values
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not math.isfinite(score):
+        return None
+    return sort_values if isinstance(doc_id, str) else None
+
+
+def build_wildcard_query(pattern):
+    """把用户输入的通配符模式改写为针对标题子字段的查询，模式匹配整个标题且不区分大小写
+
+    - 不含通配符时按“标题包含该文字”处理，即 *pattern*
+    - 只有末尾的 *（如 南开*）时查 title.prefix：索引时已展开所有前缀，只需一次词项查找
+    - 其它模式（前导 / 中间的 *、?）查 title.wild：wildcard 类型的字段用 n-gram 筛选候选，不扫描词典
+    两种查询都不计算相关度（constant_score），结果的先后由 PageRank 决定。
+    """
+    pattern = " ".join(pattern.split())
+    if '*' not in pattern and '?' not in pattern:
+        pattern = f"*{pattern}*"
+    prefix = pattern.rstrip('*')
+    if prefix and pattern != prefix and '*' not in prefix and '?' not in prefix \
+            and len(prefix) <= title_prefix_max_chars:
+        text_query = {"match": {"title.prefix": prefix}}
+    else:
+        text_query = {"wildcard": {"title.wild": {"value": pattern, "case_insensitive": True}}}
+    return {"constant_score": {"filter": text_query}}
 
-def search(query, username=None, use_wildcard=False):
-    """进行搜索并考虑历史记录和PageRank进行个性化排序"""
-    # Step 1: 原始查询，得到初步搜索结果
+
+def build_search_body(query, use_wildcard=False, search_after=None):
+    """检索请求的查询体；engine 模式下用 function_score 把 PageRank 加到相关度得分上
+
+    结果按 (得分, doc_id) 稳定排序，翻页时用 search_after 从上一页最后一条之后继续，
+    每页的开销与页码无关。
+    """
     if use_wildcard:
-        query_body = {
-            "query": {
-                "wildcard": {
-                    "title": {
-                        "value": query
-                    }
-                }
+        text_query = build_wildcard_query(query)
+    else:
+        text_query = {
+            "multi_match": {
+                "query": query,
+                "fields": search_fields
             }
         }
-    else:
-        query_body = {
-            "query": {
-                "multi_match": {
-                    "query": query,
-                    "fields": [
-                        "title^3",  # 给标题更高的权重
-                        "description^2",  # 给描述适中的权重
-                        "anchor_texts^2",  # 给 anchor_texts 权重
-                        "page_rank^1",  # 给 page_rank 最低的权重
-                        "url^1"  # 可选的，给 URL 加上权重
-                    ]
-                }
+
+    if scoring_mode == 'engine':
+        text_query = {
+            "function_score": {
+                "query": text_query,
+                "functions": [{
+                    "field_value_factor": {
+                        "field": "pagerank",
+                        "factor": pagerank_factor,
+                        "modifier": "log1p",
+                        "missing": 0
+                    },
+                    "weight": pagerank_weight
+                }],
+                "score_mode": "sum",
+                "boost_mode": "sum"
             }
         }
 
-    # 执行查询
-    response = es.search(index=index_name, body=query_body)
-    hits = response['hits']['hits']
+    query_body = {
+        "query": text_query,
+        "size": page_size,
+        # doc_id 作为得分相同时的次序，保证翻页稳定；旧版本索引没有该字段时忽略
+        "sort": [{"_score": "desc"}, {"doc_id": {"order": "asc", "unmapped_type": "keyword"}}]
+    }
+    if search_after:
+        query_body["search_after"] = search_after
+    return query_body
 
-    # Step 2: 获取用户历史记录
-    user_history = get_search_history(username) if username else []
 
-    # Step 3: 计算历史记录的余弦相似度
-    historical_similarities = []
-    for hit in hits:
-        title = hit['_source'].get('title', '').strip()
-        similarity = 0
-        for history_item in user_history:
-            similarity += compute_cosine_similarity(history_item.strip(), title)
-        historical_similarities.append(similarity)
-
-    # Step 4: 计算查询词与结果的余弦相似度
-    query_similarities = []
-    for hit in hits:
-        title = hit['_source'].get('title', '').strip()
-        query_similarities.append(compute_cosine_similarity(query, title))
-
-    # Step 5: 获取PageRank
-    pageranks = [hit['_source'].get('page_rank', 0) for hit in hits]
-
-    # Step 6: 归一化所有得分
-    def normalize(scores):
-        min_score = min(scores)
-        max_score = max(scores)
-        return [(score - min_score) / (max_score - min_score) if max_score != min_score else 0 for score in scores]
-
-    historical_similarities = normalize(historical_similarities)
-    query_similarities = normalize(query_similarities)
-    pageranks = normalize(pageranks)
-
-    # Step 7: 加权综合评分
-    weighted_scores = []
-    weight_history = 0.6
-    weight_query = 0.2
-    weight_pagerank = 0.2
-
-    for i in range(len(hits)):
-        score = (weight_history * historical_similarities[i] +
-                 weight_query * query_similarities[i] +
-                 weight_pagerank * pageranks[i])
-        weighted_scores.append(score)
-
-    # Step 8: 对每个结果的 URL 进行处理
-    for hit in hits:
-        url = hit['_source'].get('url', '').strip()
-        cleaned_url = clean_url(url)
-        hit['_source']['url'] = cleaned_url  # 更新 URL 为去除前缀后的版本
+def make_cache_key(query, use_wildcard, cursor=None):
+    return (normalize_query(query), use_wildcard, scoring_mode, cursor or None)
 
-    # 去重：根据标题去重
-    seen_titles = set()
-    unique_hits = []
-    for hit in hits:
-        title = hit['_source'].get('title', '').strip()
-        if title not in seen_titles:
-            seen_titles.add(title)
-            unique_hits.append(hit)
 
-    # 之后的代码使用 unique_hits 代替 hits
-    hits = unique_hits
+def cache_hits(cache_key, hits):
+    """对一页原始结果做 URL 清理和标题去重，与下一页的游标一起放入缓存并返回"""
+    # 按去重前最后一条结果的排序值生成下一页的游标
+    next_cursor = encode_cursor(hits[-1]['sort']) if len(hits) >= page_size and 'sort' in hits[-1] else None
 
-    # Step 8: 根据综合得分进行排序
-    # 对结果按照 weighted_scores 排序
-    sorted_results = [hit for _, hit in sorted(zip(weighted_scores, hits), key=lambda x: x[0], reverse=True)]
+    with metrics.timer("web_stage", stage="dedup"):
+        # 对每个结果的 URL 进行处理
+        for hit in hits:
+            url = hit['_source'].get('url', '').strip()
+            cleaned_url = clean_url(url)
+            hit['_source']['url'] = cleaned_url  # 更新 URL 为去除前缀后的版本
 
-    return sorted_results
+        # 去重：根据标题去重（先去重再计算得分，保证得分与结果一一对应）
+        seen_titles = set()
+        unique_hits = []
+        for hit in hits:
+            title = hit['_source'].get('title', '').strip()
+            if title not in seen_titles:
+                seen_titles.add(title)
+                unique_hits.append(hit)
 
+    result_cache.put(cache_key, (unique_hits, next_cursor))
+    return list(unique_hits), next_cursor
 
 
 
-def save_html_snapshot(url, filename):
-    """保存网页的 HTML 快照"""
-    response = requests.get(url)
-    if response.status_code == 200:
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        return True
-    return False
 
+def is_archived(url):
+    """URL 是否在原始网页存档中（只查索引，不读取内容）"""
+    if url not in page_store:
+        page_store.refresh()  # 爬虫可能在本进程启动后写入了新的页面
+    return url in page_store
 
-def save_screenshot_snapshot(url, filename):
-    """使用 Selenium 截图保存网页快照"""
-    options = Options()
-    options.headless = True  # 设置无头模式
-    driver = webdriver.Chrome(options=options)
-    driver.get(url)
 
-    # 等待页面加载完成后截屏
-    driver.save_screenshot(filename)
-    driver.quit()
-    return True
+def get_archived_page(url):
+    """返回 (原始内容, Content-Type)，存档中没有该 URL 时返回 (None, None)"""
+    if not is_archived(url):
+        return None, None
+    info = page_store.info(url)
+    if info is None:
+        return None, None
+    return page_store.get_by_hash(info['hash']), info.get('content_type') or 'text/html; charset=utf-8'
 
 
 def save_search_history(username, query):
-    """保存用户的查询历史"""
-    history_file = f'history/{username}.txt'
-    # 读取现有历史记录
-    if os.path.exists(history_file):
-        with open(history_file, 'r', encoding='utf-8') as f:
-            history = f.readlines()
-    else:
-        history = []
-
-    # 将最新查询添加到历史记录
-    history.append(query + '\n')
-
-
-    # 保存历史记录，使用 UTF-8 编码
-    with open(history_file, 'w', encoding='utf-8') as f:
-        f.writelines(history)
+    """保存用户的查询历史（追加到内存中，由后台线程批量写入数据库）"""
+    with metrics.timer("web_stage", stage="history_write"):
+        history_store.append(username, query)
+        suggest_index.add_query(query, username)
 
 
 def get_search_history(username):
-    """获取用户的查询历史（最多 5 条）"""
-    history_file = f'history/{username}.txt'
-    if os.path.exists(history_file):
-        with open(history_file, 'r', encoding='utf-8') as f:
-            history = f.readlines()
-        return history[-5:]  # 返回最近的 5 条
-    return []
+    """获取用户的查询历史（最多 5 条，从内存中读取）"""
+    with metrics.timer("web_stage", stage="history_read"):
+        return history_store.recent(username, 5)  # 返回最近的 5 条
 
 
-@app.route('/')
 def index():
     """显示主页（搜索框和登录链接）"""
     if 'username' in session:
@@ -235,14 +242,12 @@ def index():
     return redirect(url_for('login'))  # 否则跳转到登录页面
 
 
-@app.route('/login', methods=['GET', 'POST'])
 def login():
     """登录页面"""
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        users = load_users()  # 加载用户数据
-        if users.get(username) == password:
+        if history_store.get_password(username) == password:
             session['username'] = username
             # 登录成功后，加载用户的查询历史
             recent_searches = get_search_history(username)
@@ -253,73 +258,97 @@ def login():
     return render_template('login.html')  # GET 请求时，显示登录页面
 
 
-@app.route('/logout')
 def logout():
     """登出功能"""
     session.pop('username', None)  # 清除会话
     return redirect(url_for('login'))  # 跳转回登录页面
 
 
-@app.route('/register', methods=['GET', 'POST'])
 def register():
     """用户注册页面"""
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        users = load_users()  # 加载现有用户
-        if username in users:
+        if not history_store.add_user(username, password):  # 添加新用户
             return "Username already exists, please choose another one.", 400  # 用户名已存在
-        users[username] = password  # 添加新用户
-        save_users(users)  # 保存到文件
         return redirect(url_for('login'))  # 注册成功后跳转到登录页面
 
     return render_template('register.html')  # 显示注册页面
 
 
-def get_personalized_recommendations(username, query, search_results):
-    """获取个性化推荐，基于用户历史查询，并去除已显示的搜索结果"""
-    user_history = get_search_history(username)  # 获取用户历史查询
-
-    # 将当前查询与历史查询记录结合起来，作为新的查询
+def build_recommendation_body(query, user_history):
+    """推荐请求的查询体：将当前查询与历史查询记录结合起来，作为新的查询"""
     combined_query = query + ' ' + ' '.join(user_history)  # 合并当前查询与历史查询
 
-    # 在 Elasticsearch 中进行搜索，获取推荐内容
-    query_body = {
+    return {
+        # 多取几条，排除已显示的搜索结果后仍能凑够 num_recommendations 条
+        "size": num_recommendations * 3,
         "query": {
             "multi_match": {
                 "query": combined_query,
-                "fields": [
-                    "title^3",  # 给标题更高的权重
-                    "description^2",  # 给描述适中的权重
-                    "anchor_texts^2",  # 给 anchor_texts 权重
-                    "url^1"  # 给 URL 加上权重
-                ]
+                "fields": search_fields
             }
         }
     }
 
-    # 执行查询
-    response = es.search(index=index_name, body=query_body)
-    hits = response['hits']['hits']
 
+def get_personalized_recommendations(search_results, hits):
+    """由推荐查询（build_recommendation_body）的结果生成个性化推荐，并去除已显示的搜索结果"""
     # 将搜索结果的 URLs 提取出来，便于后续去重
     search_result_urls = {hit['_source'].get('url', '') for hit in search_results}
 
     # 过滤掉已经出现在搜索结果中的推荐项
     recommended_results = []
-    for hit in hits[:5]:  # 取前 5 个相关结果
-        url = hit['_source'].get('url', '')
+    for hit in hits:
+        url = clean_url(hit['_source'].get('url', '').strip())
         if url not in search_result_urls:  # 如果推荐的 URL 不在搜索结果中
             recommended_results.append({
                 'title': hit['_source'].get('title', ''),
                 'url': url,
                 'description': hit['_source'].get('description', ''),
             })
+            if len(recommended_results) >= num_recommendations:  # 取前 5 个相关结果
+                break
 
     return recommended_results
 
 
-@app.route('/search', methods=['GET', 'POST'])
+def search_with_recommendations(query, username, use_wildcard=False, cursor=None):
+    """检索一页结果并获取个性化推荐，两个查询合并为一次 _msearch 请求
+
+    检索结果命中缓存时只发送推荐查询。返回 (检索结果, 推荐结果, 下一页的游标)。
+    """
+    user_history = get_search_history(username)
+    recommendation_body = build_recommendation_body(query, user_history)
+    cache_key = make_cache_key(query, use_wildcard, cursor)
+    cached = result_cache.get(cache_key)
+
+    if cached is not None:
+        unique_hits, next_cursor = cached
+        unique_hits = list(unique_hits)
+        with metrics.timer("web_stage", stage="es_recommendations"):
+            response = es.search(index=index_name, body=recommendation_body)
+        recommendation_hits = response['hits']['hits']
+    else:
+        with metrics.timer("web_stage", stage="es_msearch"):
+            response = es.msearch(searches=[
+                {"index": index_name}, build_search_body(query, use_wildcard, decode_cursor(cursor)),
+                {"index": index_name}, recommendation_body,
+            ])
+        search_response, recommendation_response = response['responses']
+        for item in (search_response, recommendation_response):
+            if 'error' in item:
+                raise SearchError(f"msearch request failed: {item['error']}")
+        unique_hits, next_cursor = cache_hits(cache_key, search_response['hits']['hits'])
+        recommendation_hits = recommendation_response['hits']['hits']
+
+    with metrics.timer("web_stage", stage="rerank"):
+        search_results = rerank(query, unique_hits, user_history, use_engine_score=scoring_mode == 'engine')
+    with metrics.timer("web_stage", stage="recommendations"):
+        recommended_results = get_personalized_recommendations(search_results, recommendation_hits)
+    return search_results, recommended_results, next_cursor
+
+
 def search_page():
     """搜索页面，显示检索结果和个性化推荐"""
     if 'username' not in session:
@@ -331,21 +360,24 @@ def search_page():
     if request.method == 'POST':
         query = request.form['query']
         use_wildcard = 'wildcard' in request.form  # 检查是否勾选了通配符查询
-        search_results = search(query, username=username, use_wildcard=use_wildcard)  # 调用搜索函数进行检索
+        cursor = request.form.get('cursor') or None  # 翻页时为上一页返回的游标
+        page = request.form.get('page', 1, type=int)
+        # 检索并获取个性化推荐（基于用户历史查询和当前查询，排除搜索结果中已显示的内容），只需一次往返
+        search_results, recommended_results, next_cursor = search_with_recommendations(
+            query, username, use_wildcard, cursor)
 
-        # 保存查询历史
-        save_search_history(username, query)
+        # 保存查询历史（翻页不算新的查询）
+        if cursor is None:
+            save_search_history(username, query)
 
-        # 获取个性化推荐，基于用户历史查询和当前查询，排除搜索结果中已显示的内容
-        recommended_results = get_personalized_recommendations(username, query, search_results)
-
-        return render_template('result.html', query=query, results=search_results, recent_searches=recent_searches, recommended_results=recommended_results)
+        return render_template('result.html', query=query, results=search_results, recent_searches=recent_searches,
+                               recommended_results=recommended_results, use_wildcard=use_wildcard,
+                               page=page, next_cursor=next_cursor)
 
     return render_template('search.html', recent_searches=recent_searches)  # 显示搜索框并展示查询历史
 
 
 
-@app.route('/snapshot', methods=['GET', 'POST'])
 def snapshot():
     """网页快照功能"""
     if 'username' not in session:
@@ -356,19 +388,164 @@ def snapshot():
         snapshot_type = request.form['snapshot_type']
 
         if snapshot_type == 'html':
-            filename = f"html_snapshots/{url.split('//')[1].replace('/', '_')}.html"
-            success = save_html_snapshot(url, filename)
-            message = "HTML snapshot saved successfully!" if success else "Failed to save HTML snapshot."
+            if is_archived(url):
+                return redirect(url_for('archived_page', url=url))
+            message = "This page is not in the crawl archive."
 
         elif snapshot_type == 'screenshot':
-            filename = f"screenshot_snapshots/{url.split('//')[1].replace('/', '_')}.png"
-            success = save_screenshot_snapshot(url, filename)
-            message = "Screenshot snapshot saved successfully!" if success else "Failed to save screenshot snapshot."
+            try:
+                job = snapshot_service.submit(url)
+            except QueueFull:
+                return "Too many snapshot requests, please try again later.", 503
+            except URLNotAllowed as e:
+                return render_template('snapshot_result.html', message=str(e), url=url), 400
+            return render_template('snapshot_result.html', message=f"Screenshot snapshot {job.status}.",
+                                   url=url, job=job.to_dict())
 
         return render_template('snapshot_result.html', message=message, url=url)
 
     return render_template('snapshot.html')  # 网页快照页面
 
 
+def archived_page():
+    """从原始网页存档返回 URL 被抓取时的 HTML
+
+    存档的是第三方网页，与本站同源返回时其中的脚本可以读取用户的检索结果和历史。
+    因此用 CSP sandbox 把页面放入独立的源并禁止脚本，并禁止浏览器猜测内容类型。
+    """
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    content, content_type = get_archived_page(request.args.get('url', ''))
+    if content is None:
+        abort(404)
+    response = Response(content, content_type=content_type)
+    response.headers['Content-Security-Policy'] = "sandbox"
+    response.headers['X-Content-Type-Options'] = "nosniff"
+    return response
+
+
+def snapshot_job(job_id):
+    """截图任务的状态（JSON）"""
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    job = snapshot_service.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
+def snapshot_image(job_id):
+    """已完成任务的截图"""
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    job = snapshot_service.get(job_id)
+    if job is None or job.status != DONE:
+        abort(404)
+    return send_file(os.path.abspath(job.path), mimetype='image/png')
+
+
+def suggest_view():
+    """自动补全：返回以 q 开头的候选查询（JSON）"""
+    if 'username' not in session:
+        return redirect(url_for('login'))
+    query = request.args.get('q', '')
+    k = max(1, min(request.args.get('k', 8, type=int), 10))
+    return jsonify({"query": query, "suggestions": suggest_index.suggest(query, k)})
+
+
+def metrics_view():
+    """Prometheus 格式的指标（各阶段耗时、请求数、缓存和截图服务的状态），供监控系统抓取"""
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+def record_request(response):
+    """记录每个请求的耗时和状态码"""
+    endpoint = request.endpoint or 'unknown'
+    if 'request_start' in g:
+        metrics.observe("web_request", time.perf_counter() - g.request_start, endpoint=endpoint)
+    metrics.inc("web_requests_total", endpoint=endpoint, status=response.status_code)
+    return response
+
+
+def collect_service_stats():
+    """输出 /metrics 时读取检索结果缓存、截图服务和自动补全的计数"""
+    values = {}
+    for name, stats in (("result_cache", result_cache.stats()), ("snapshot", snapshot_service.stats()),
+                        ("suggest", suggest_index.stats())):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[f"{name}_{key}"] = value
+    return values
+
+
+def create_app(config=None):
+    """创建 Flask 应用及其依赖的客户端和存储，注册路由，并输出启动耗时
+
+    客户端和存储保存在模块的全局变量中，第二次调用会改变已创建的应用，因此直接报错。
+    没有配置 SECRET_KEY 时拒绝启动。
+    """
+    global _app, es, history_store, page_store, snapshot_service, result_cache, suggest_index
+    if _app is not None:
+        raise RuntimeError("create_app can only be called once per process")
+    start = time.perf_counter()
+
+    # 创建 Flask 应用
+    app = Flask(__name__, template_folder=os.path.join(os.getcwd(), 'web'))
+    app.config.update(default_config)
+    app.config.update(config or {})
+    if not app.config['SECRET_KEY']:
+        raise RuntimeError("SECRET_KEY is not set; export SECRET_KEY before starting the web server")
+    Session(app)
+
+    if app.config['SEARCH_BACKEND'] == 'local':
+        # 本地后端不需要安装 elasticsearch 包
+        from local_search import LocalSearch
+        es = LocalSearch(app.config['LOCAL_INDEX_DIR'])
+    else:
+        from elasticsearch import Elasticsearch
+        # Elasticsearch 客户端在进程内共享，按节点复用 keep-alive 连接
+        es = Elasticsearch(app.config['ES_HOSTS'], connections_per_node=app.config['ES_CONNECTIONS'],
+                           request_timeout=app.config['ES_TIMEOUT'])
+    history_store = HistoryStore(app.config['HISTORY_DB'])
+    page_store = PageStore(app.config['PAGE_STORE_DIR'])
+    snapshot_service = SnapshotService(pool_size=app.config['SNAPSHOT_POOL_SIZE'],
+                                       cache_dir=app.config['SNAPSHOT_DIR'])
+    result_cache = QueryCache(max_size=app.config['RESULT_CACHE_SIZE'], ttl=app.config['RESULT_CACHE_TTL'])
+    # 标题和锚文本在第一次补全请求时加载
+    suggest_index = SuggestIndex(history_store.query_users())
+
+    metrics.enabled = app.config['METRICS_ENABLED']
+    if metrics.enabled:
+        app.before_request(start_request_timer)
+        app.after_request(record_request)
+        metrics.register_collector(collect_service_stats)
+
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/login', view_func=login, methods=['GET', 'POST'])
+    app.add_url_rule('/logout', view_func=logout)
+    app.add_url_rule('/register', view_func=register, methods=['GET', 'POST'])
+    app.add_url_rule('/search', view_func=search_page, methods=['GET', 'POST'])
+    app.add_url_rule('/snapshot', view_func=snapshot, methods=['GET', 'POST'])
+    app.add_url_rule('/snapshot/page', view_func=archived_page)
+    app.add_url_rule('/snapshot/jobs/<job_id>', view_func=snapshot_job)
+    app.add_url_rule('/snapshot/jobs/<job_id>/image', view_func=snapshot_image)
+    app.add_url_rule('/suggest', view_func=suggest_view)
+    app.add_url_rule('/metrics', view_func=metrics_view)
+
+    _app = app
+    app.config['STARTUP_SECONDS'] = import_seconds + time.perf_counter() - start
+    print(f"Web worker {os.getpid()} ready in {app.config['STARTUP_SECONDS'] * 1000:.0f} ms "
+          f"(imports {import_seconds * 1000:.0f} ms, create_app {(time.perf_counter() - start) * 1000:.0f} ms)")
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # 开发服务器；生产环境使用 gunicorn -c gunicorn.conf.py wsgi:app
+    # 没有设置 SECRET_KEY 时使用随机密钥，重启后原来的会话失效
+    create_app({'SECRET_KEY': os.environ.get('SECRET_KEY') or secrets.token_hex(32)}).run(debug=True)
@@ -0,0 +1,7 @@
+"""生产环境入口：SECRET_KEY=... gunicorn -c gunicorn.conf.py wsgi:app
+
+会话签名密钥从环境变量 SECRET_KEY 读取，没有设置时拒绝启动。
+"""
+from web import create_app
+
+app = create_app()